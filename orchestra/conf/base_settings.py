@@ -49,6 +49,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'orchestra.core.caches.RequestCacheMiddleware',
+    'orchestra.contrib.resources.middlewares.ResourceRelationsMiddleware',
     # also handles transations, ATOMIC_REQUESTS does not wrap middlewares
     'orchestra.contrib.orchestration.middlewares.OperationsMiddleware',
     # Uncomment the next line for simple clickjacking protection:
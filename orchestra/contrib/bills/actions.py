@@ -1,38 +1,51 @@
-import zipfile
-from io import StringIO
+import logging
 
 from django.contrib import messages
 from django.contrib.admin import helpers
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.utils.safestring import mark_safe
 from django.utils.translation import ungettext, ugettext_lazy as _
 
 from orchestra.admin.forms import adminmodelformset_factory
 from orchestra.admin.utils import get_object_from_url, change_url
-from orchestra.utils.html import html_to_pdf
 
+from . import settings, tasks
 from .forms import SelectSourceForm
 from .helpers import validate_contact
+from .pdf import stream_bills
+
+
+logger = logging.getLogger(__name__)
 
 
 def download_bills(modeladmin, request, queryset):
-    if queryset.count() > 1:
-        stringio = StringIO()
-        archive = zipfile.ZipFile(stringio, 'w')
-        for bill in queryset:
-            pdf = html_to_pdf(bill.html or bill.render())
-            archive.writestr('%s.pdf' % bill.number, pdf)
-        archive.close()
-        response = HttpResponse(stringio.getvalue(), content_type='application/pdf')
+    num = queryset.count()
+    if num > 1:
+        threshold = settings.BILLS_EXPORT_ASYNC_THRESHOLD
+        if threshold is not None and num > threshold:
+            tasks.export_bills.delay(list(queryset.values_list('pk', flat=True)), request.user.pk)
+            msg = _("%(num)i bills are being exported, the download link will be sent to %(email)s.")
+            messages.info(request, msg % {
+                'num': num,
+                'email': request.user.email,
+            })
+            return
+        
+        def progress(done):
+            if done % 100 == 0 or done == num:
+                logger.info("%i of %i bills exported for %s" % (done, num, request.user))
+        
+        # ZIP entries are sent as each PDF gets rendered
+        response = StreamingHttpResponse(stream_bills(queryset, progress=progress),
+            content_type='application/zip')
         response['Content-Disposition'] = 'attachment; filename="orchestra-bills.zip"'
         return response
     bill = queryset.get()
-    pdf = html_to_pdf(bill.html or bill.render())
-    return HttpResponse(pdf, content_type='application/pdf')
+    return HttpResponse(bill.get_pdf(), content_type='application/pdf')
 download_bills.verbose_name = _("Download")
 download_bills.url_name = 'download'
 
@@ -1,11 +1,15 @@
+import os
+
 from django import forms
 from django.conf.urls import patterns, url
 from django.contrib import admin
 from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
 from django.db import models
 from django.db.models import F, Sum, Prefetch
 from django.db.models.functions import Coalesce
+from django.http import FileResponse, Http404
 from django.templatetags.static import static
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
@@ -15,7 +19,7 @@ from orchestra.admin.utils import admin_date, insertattr, admin_link
 from orchestra.contrib.accounts.admin import AccountAdminMixin, AccountAdmin
 from orchestra.forms.widgets import paddingCheckboxSelectMultiple
 
-from . import settings, actions
+from . import settings, actions, pdf
 from .filters import BillTypeListFilter, HasBillContactListFilter
 from .models import Bill, Invoice, AmendmentInvoice, Fee, AmendmentFee, ProForma, BillLine, BillSubline, BillContact
 
@@ -233,9 +237,24 @@ class BillAdmin(AccountAdminMixin, ExtendedModelAdmin):
             url("^manage-lines/$",
                 admin_site.admin_view(BillLineManagerAdmin(BillLine, admin_site).changelist_view),
                 name='bills_bill_manage_lines'),
+            url("^exports/(?P<name>orchestra-bills-[0-9]+-[0-9a-f]+\.zip)$",
+                admin_site.admin_view(self.export_view),
+                name='bills_bill_export'),
         )
         return extra_urls + urls
     
+    def export_view(self, request, name):
+        """ Downloads the archive of a background export, only available to its owner """
+        if pdf.get_export_owner(name) != request.user.pk and not request.user.is_superuser:
+            raise PermissionDenied
+        try:
+            archive = open(os.path.join(pdf.get_export_dir(), name), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(archive, content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="%s"' % name
+        return response
+    
     def get_readonly_fields(self, request, obj=None):
         fields = super(BillAdmin, self).get_readonly_fields(request, obj)
         if obj and not obj.is_open:
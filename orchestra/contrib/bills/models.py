@@ -14,9 +14,9 @@ from django.utils.translation import ugettext_lazy as _
 from orchestra.contrib.accounts.models import Account
 from orchestra.contrib.contacts.models import Contact
 from orchestra.core import accounts, validators
-from orchestra.utils.html import html_to_pdf
 
 from . import settings
+from .pdf import render_pdf
 
 
 class BillContact(models.Model):
@@ -181,7 +181,6 @@ class Bill(models.Model):
         return transaction
     
     def send(self):
-        html = self.html or self.render()
         self.account.send_email(
             template=settings.BILLS_EMAIL_NOTIFICATION_TEMPLATE,
             context={
@@ -189,12 +188,16 @@ class Bill(models.Model):
             },
             contacts=(Contact.BILLING,),
             attachments=[
-                ('%s.pdf' % self.number, html_to_pdf(html), 'application/pdf')
+                ('%s.pdf' % self.number, self.get_pdf(), 'application/pdf')
             ]
         )
         self.is_sent = True
         self.save(update_fields=['is_sent'])
     
+    def get_pdf(self):
+        """ PDFs of closed bills are cached, their HTML does not change """
+        return render_pdf(self.html or self.render(), cache=bool(self.html))
+    
     def render(self, payment=False, language=None):
         if payment is False:
             payment = self.account.paymentsources.get_default()
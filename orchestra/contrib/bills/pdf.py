@@ -0,0 +1,151 @@
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from orchestra.utils import paths
+from orchestra.utils.html import DisplayPool, html_to_pdf
+
+from . import settings
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ Warm displays pool, created on the first rendering, None when BILLS_PDF_RENDERERS is disabled """
+    global _pool
+    if _pool is None and settings.BILLS_PDF_RENDERERS:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DisplayPool(settings.BILLS_PDF_RENDERERS)
+    return _pool
+
+
+def get_cache_path(html):
+    """ Content-addressed path of the PDF of html, None when the cache is disabled """
+    if not settings.BILLS_PDF_CACHE_DIR:
+        return None
+    cache_dir = settings.BILLS_PDF_CACHE_DIR % {
+        'site_dir': paths.get_site_dir(),
+    }
+    digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, digest[:2], '%s.pdf' % digest)
+
+
+def render_pdf(html, cache=False):
+    """ Renders html on the warm displays pool, cached PDFs are returned without rendering """
+    path = get_cache_path(html) if cache else None
+    if path:
+        try:
+            with open(path, 'rb') as handle:
+                return handle.read()
+        except FileNotFoundError:
+            pass
+    pdf = html_to_pdf(html, pool=get_pool())
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent renderings of the same bill never expose a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(pdf)
+        os.replace(tmp_path, path)
+    return pdf
+
+
+def render_bills(bills, workers=None):
+    """
+    Yields (bill, pdf) for each bill, in order
+    
+    Bills are rendered concurrently by up to workers wkhtmltopdf processes, BILLS_PDF_RENDERERS
+    or the number of CPUs by default, each one using its own warm display when BILLS_PDF_RENDERERS
+    is enabled or its own X server otherwise. HTML of open bills is rendered on the calling thread,
+    so no database connections are opened by the workers, and at most 2*workers PDFs
+    are waiting to be consumed.
+    Closed bills never change, their PDFs are cached by the hash of their HTML.
+    """
+    workers = workers or settings.BILLS_PDF_RENDERERS or os.cpu_count() or 1
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for bill in bills:
+            html = bill.html or bill.render()
+            pending.append((bill, executor.submit(render_pdf, html, cache=bool(bill.html))))
+            if len(pending) >= 2*workers:
+                bill, future = pending.popleft()
+                yield bill, future.result()
+        while pending:
+            bill, future = pending.popleft()
+            yield bill, future.result()
+
+
+class ZipStream(object):
+    """ Write-only file object holding the zip data written since the last pop() """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_bills(bills, progress=None):
+    """
+    Yields the content of a zip archive with the PDFs of bills
+    
+    Each entry is yielded as soon as its PDF is rendered, memory is bounded by the rendering look-ahead.
+    progress(done) is called after each bill.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for done, (bill, pdf) in enumerate(render_bills(bills), 1):
+            archive.writestr('%s.pdf' % bill.number, pdf)
+            yield stream.pop()
+            if progress is not None:
+                progress(done)
+    # Central directory
+    yield stream.pop()
+
+
+def get_export_dir():
+    return settings.BILLS_EXPORT_DIR % {
+        'site_dir': paths.get_site_dir(),
+    }
+
+
+def get_export_owner(name):
+    """ Primary key of the user that requested the export name """
+    return int(name.split('-')[2])
+
+
+def export_bills(bills, owner, progress=None):
+    """
+    Stores the zip archive of bills on BILLS_EXPORT_DIR and returns its file name,
+    which records the primary key of the owner user allowed to download it
+    """
+    export_dir = get_export_dir()
+    os.makedirs(export_dir, exist_ok=True)
+    name = 'orchestra-bills-%i-%s.zip' % (owner.pk, uuid.uuid4().hex)
+    fd, tmp_path = tempfile.mkstemp(dir=export_dir, prefix='.')
+    with os.fdopen(fd, 'wb') as handle:
+        for data in stream_bills(bills, progress=progress):
+            handle.write(data)
+    os.replace(tmp_path, os.path.join(export_dir, name))
+    return name
@@ -102,3 +102,39 @@ BILLS_CONTACT_DEFAULT_COUNTRY = Setting('BILLS_CONTACT_DEFAULT_COUNTRY',
     'ES',
     choices=BILLS_CONTACT_COUNTRIES
 )
+
+
+BILLS_PDF_RENDERERS = Setting('BILLS_PDF_RENDERERS',
+    0,
+    help_text="Opt-in number of warm X displays used for rendering PDFs, which is also the number of "
+              "bills rendered concurrently on bulk exports. Displays are started by the first rendering "
+              "of each process and kept until it exits. 0 starts a new X server for each PDF and "
+              "renders as many bills concurrently as CPUs.",
+)
+
+
+BILLS_PDF_CACHE_DIR = Setting('BILLS_PDF_CACHE_DIR',
+    '%(site_dir)s/pdfs',
+    help_text="Directory where the PDFs of closed bills are kept, indexed by the hash of their HTML. "
+              "<tt>%(site_dir)s</tt> is replaced by the site directory, empty disables the cache.",
+)
+
+
+BILLS_EXPORT_ASYNC_THRESHOLD = Setting('BILLS_EXPORT_ASYNC_THRESHOLD',
+    1000,
+    help_text="Downloads of more bills than this are exported in the background, "
+              "the user gets the download link by email. None always streams the download.",
+)
+
+
+BILLS_EXPORT_DIR = Setting('BILLS_EXPORT_DIR',
+    '%(site_dir)s/exports',
+    help_text="Directory where background exports are stored. "
+              "<tt>%(site_dir)s</tt> is replaced by the site directory.",
+)
+
+
+BILLS_EXPORT_CLEANUP_DAYS = Setting('BILLS_EXPORT_CLEANUP_DAYS',
+    7,
+    help_text="Days after which background exports are deleted.",
+)
@@ -0,0 +1,46 @@
+import os
+import time
+
+from celery import shared_task
+from celery.task.schedules import crontab
+from celery.decorators import periodic_task
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.core.urlresolvers import reverse
+
+from orchestra.settings import ORCHESTRA_SITE_URL
+
+from . import settings, pdf
+from .models import Bill
+
+
+@shared_task(name='bills.ExportBills', bind=True)
+def export_bills(self, bill_ids, user_id):
+    """ Background export of large bill selections, the download link is emailed to user_id """
+    total = len(bill_ids)
+    
+    def progress(done):
+        if done % 100 == 0 or done == total:
+            self.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+    
+    user = get_user_model().objects.get(pk=user_id)
+    name = pdf.export_bills(Bill.objects.filter(pk__in=bill_ids), user, progress=progress)
+    url = ORCHESTRA_SITE_URL + reverse('admin:bills_bill_export', args=(name,))
+    send_mail(
+        "Bills export %s" % name,
+        "The export of %i bills is ready for download at %s" % (total, url),
+        None, [user.email]
+    )
+    return name
+
+
+@periodic_task(run_every=crontab(hour=6, minute=30))
+def exports_cleanup():
+    export_dir = pdf.get_export_dir()
+    if not os.path.isdir(export_dir):
+        return
+    epoch = time.time() - settings.BILLS_EXPORT_CLEANUP_DAYS*24*60*60
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        if os.path.getmtime(path) < epoch:
+            os.remove(path)
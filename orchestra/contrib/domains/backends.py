@@ -24,6 +24,10 @@ class Bind9MasterDomainBackend(ServiceController):
         ('domains.Domain', 'origin'),
     )
     ignore_fields = ['serial']
+    prefetch_related = (
+        'records',
+        'subdomain_set__records',
+    )
     doc_settings = (settings,
         ('DOMAINS_SLAVES', 'DOMAINS_MASTERS_PATH')
     )
@@ -139,6 +143,8 @@ class Bind9SlaveDomainBackend(Bind9MasterDomainBackend):
     related_models = (
         ('domains.Domain', 'origin'),
     )
+    # Zones are not rendered on slaves
+    prefetch_related = ()
     doc_settings = (settings,
         ('DOMAINS_MASTERS', 'DOMAINS_SLAVES_PATH')
     )
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import Case, Value, When
+
+
+BATCH_SIZE = 1000
+
+
+def fill_reversed_names(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Single statement, labels are reversed by their array subscripts
+        schema_editor.execute(
+            "UPDATE domains_domain SET reversed_name = array_to_string(ARRAY("
+            "  SELECT (string_to_array(name, '.'))[i]"
+            "  FROM generate_subscripts(string_to_array(name, '.'), 1) AS i ORDER BY i DESC"
+            "), '.')"
+        )
+        return
+    Domain = apps.get_model('domains', 'Domain')
+    names = list(Domain.objects.values_list('pk', 'name'))
+    for ix in range(0, len(names), BATCH_SIZE):
+        batch = names[ix:ix+BATCH_SIZE]
+        whens = [
+            When(pk=pk, then=Value('.'.join(reversed(name.split('.'))))) for pk, name in batch
+        ]
+        Domain.objects.filter(pk__in=[pk for pk, __ in batch]).update(
+            reversed_name=Case(*whens, output_field=models.CharField()))
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('domains', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='domain',
+            name='reversed_name',
+            field=models.CharField(default='', max_length=256, editable=False, verbose_name='reversed name'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_reversed_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='domain',
+            name='reversed_name',
+            field=models.CharField(max_length=256, db_index=True, editable=False, verbose_name='reversed name'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# AddField and AlterField only create a plain btree index, which PostgreSQL can not use for
+# LIKE 'prefix%' lookups on non-C locales. CreateModel would also have created this one.
+INDEX = 'domains_domain_reversed_name_like'
+
+
+def create_like_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX %s ON domains_domain (reversed_name varchar_pattern_ops)' % INDEX
+        )
+
+
+def drop_like_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % INDEX)
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('domains', '0002_domain_reversed_name'),
+    ]
+    
+    operations = [
+        migrations.RunPython(create_like_index, drop_like_index),
+    ]
@@ -22,23 +22,25 @@ class Domain(models.Model):
         editable=False)
     serial = models.IntegerField(_("serial"), default=utils.generate_zone_serial,
         help_text=_("Serial number"))
+    # com.example.www, subdomains are looked up by prefix using its index
+    reversed_name = models.CharField(_("reversed name"), max_length=256, db_index=True,
+        editable=False)
     
     def __str__(self):
         return self.name
     
+    @staticmethod
+    def get_reversed_name(name):
+        return '.'.join(reversed(name.split('.')))
+    
     @classmethod
     def get_parent_domain(cls, name, top=False):
-        """ get the next domain on the chain """
+        """ get the next domain on the chain, or the top one, using a single query """
         split = name.split('.')
-        parent = None
-        for i in range(1, len(split)-1):
-            name = '.'.join(split[i:])
-            domain = Domain.objects.filter(name=name)
-            if domain:
-                parent = domain.get()
-                if not top:
-                    return parent
-        return parent
+        names = ['.'.join(split[i:]) for i in range(1, len(split)-1)]
+        parents = Domain.objects.filter(name__in=names)
+        parents = sorted(parents, key=lambda domain: len(domain.name), reverse=not top)
+        return parents[0] if parents else None
     
     @property
     def origin(self):
@@ -51,13 +53,15 @@ class Domain(models.Model):
     
     @property
     def subdomains(self):
-        return Domain.objects.filter(name__regex='\.%s$' % self.name)
+        reversed_name = self.get_reversed_name(self.name)
+        return Domain.objects.filter(reversed_name__startswith=reversed_name + '.')
     
     def clean(self):
         self.name = self.name.lower()
     
     def save(self, *args, **kwargs):
         """ create top relation """
+        self.reversed_name = self.get_reversed_name(self.name)
         update = False
         if not self.pk:
             top = self.get_parent(top=True)
@@ -91,7 +95,11 @@ class Domain(models.Model):
     
     def get_subdomains(self):
         """ proxy method, needed for input validation, see helpers.domain_for_validation """
-        return self.origin.subdomain_set.all().prefetch_related('records')
+        origin = self.origin
+        if 'subdomain_set' in getattr(origin, '_prefetched_objects_cache', {}):
+            # Prefetched by Bind9MasterDomainBackend
+            return origin.subdomain_set.all()
+        return origin.subdomain_set.all().prefetch_related('records')
     
     def get_parent(self, top=False):
         return self.get_parent_domain(self.name, top=top)
@@ -0,0 +1,72 @@
+"""
+Benchmarks, not collected by the test runner
+    
+    python manage.py test orchestra.contrib.domains.tests.benchmarks
+"""
+import sys
+import timeit
+import unittest
+
+from django.db import connection
+
+from orchestra.utils.tests import BaseTestCase
+
+from ..models import Domain
+
+
+class DomainHierarchyBenchmark(BaseTestCase):
+    DOMAINS = 500000
+    SUBDOMAINS = 4
+    REPEAT = 20
+    
+    def setUp(self):
+        account = self.create_account()
+        domains = []
+        for num in range(self.DOMAINS//(self.SUBDOMAINS+1)):
+            names = ['example%i.com' % num]
+            names += ['sub%i.example%i.com' % (sub, num) for sub in range(self.SUBDOMAINS)]
+            for name in names:
+                domains.append(Domain(name=name, account=account,
+                    reversed_name=Domain.get_reversed_name(name)))
+        Domain.objects.bulk_create(domains, batch_size=10000)
+        self.domain = Domain.objects.get(name='example%i.com' % (num//2))
+    
+    def get_parent_domain(self, name):
+        """ previous implementation, one query per label """
+        split = name.split('.')
+        for i in range(1, len(split)-1):
+            domain = Domain.objects.filter(name='.'.join(split[i:]))
+            if domain:
+                return domain.get()
+    
+    def test_lookups(self):
+        name = self.domain.name
+        regex = timeit.timeit(
+            lambda: Domain.objects.filter(name__regex='\.%s$' % name).count(), number=self.REPEAT)
+        prefix = timeit.timeit(lambda: self.domain.subdomains.count(), number=self.REPEAT)
+        sys.stderr.write(
+            "\n%i subdomain lookups over %i domains: regex %.4fs, reversed name prefix %.4fs (x%.0f)\n" % (
+                self.REPEAT, self.DOMAINS, regex, prefix, regex/prefix)
+        )
+        self.assertEqual(self.SUBDOMAINS, self.domain.subdomains.count())
+        name = 'www.a.b.sub0.%s' % name
+        per_label = timeit.timeit(lambda: self.get_parent_domain(name), number=self.REPEAT)
+        single = timeit.timeit(lambda: Domain.get_parent_domain(name), number=self.REPEAT)
+        sys.stderr.write(
+            "%i parent lookups: one query per label %.4fs, single query %.4fs\n" % (
+                self.REPEAT, per_label, single)
+        )
+        self.assertEqual(self.get_parent_domain(name), Domain.get_parent_domain(name))
+        self.assertLess(prefix, regex)
+    
+    @unittest.skipUnless(connection.vendor == 'postgresql', "EXPLAIN output is PostgreSQL specific")
+    def test_subdomains_plan(self):
+        """ the prefix lookup is answered by the varchar_pattern_ops index, not a table scan """
+        sql, params = self.domain.subdomains.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE domains_domain')
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        sys.stderr.write("\nsubdomains query plan:\n%s\n" % plan)
+        self.assertIn('domains_domain_reversed_name_like', plan)
+        self.assertNotIn('Seq Scan', plan)
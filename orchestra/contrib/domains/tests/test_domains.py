@@ -15,4 +15,16 @@ class DomainTest(BaseTestCase):
         account = self.create_account()
         domain = Domain.objects.create(name='rostrepalid.org', account=account)
         domain.render_zone()
-
+    
+    def test_hierarchy_lookups(self):
+        account = self.create_account()
+        domain = Domain.objects.create(name='rostrepalid.org', account=account)
+        Domain.objects.create(name='www.rostrepalid.org')
+        Domain.objects.create(name='*.www.rostrepalid.org')
+        Domain.objects.create(name='fakerostrepalid.org', account=account)
+        www = Domain.objects.get(name='www.rostrepalid.org')
+        self.assertEqual('org.rostrepalid.www', www.reversed_name)
+        self.assertEqual(domain, www.top)
+        self.assertEqual(2, domain.subdomains.count())
+        self.assertEqual(www, Domain.get_parent_domain('*.www.rostrepalid.org'))
+        self.assertEqual(domain, Domain.get_parent_domain('*.www.rostrepalid.org', top=True))
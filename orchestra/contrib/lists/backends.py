@@ -173,9 +173,11 @@ class MailmanTraffic(ServiceMonitor):
     )
     
     def prepare(self):
+        self.prefetch_last_dates()
+        self.append(self.get_log_reader())
         postlog = settings.LISTS_MAILMAN_POST_LOG_PATH
         context = {
-            'postlogs': str((postlog, postlog+'.1')),
+            'postlog': postlog,
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
         }
         self.append(textwrap.dedent("""\
@@ -191,10 +193,13 @@ class MailmanTraffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            postlogs = {postlogs}
+            postlog = '{postlog}'
             # Use local timezone
             end_date = to_local_timezone('{current_date}')
             end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
+            if incremental:
+                # Lines are only read once, the ones logged after current_date can not be left behind
+                end_date = 99999999999999
             lists = {{}}
             months = {{
                 'Jan': '01',
@@ -217,27 +222,22 @@ class MailmanTraffic(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 lists[list_name] = [ini_date, object_id, 0]
             
-            def monitor(lists, end_date, months, postlogs):
-                for postlog in postlogs:
+            def monitor(lists, end_date, months, postlog):
+                for line in readlines(postlog):
+                    month, day, time, year, __, __, __, list_name, __, __, size = line.split()[:11]
                     try:
-                        with open(postlog, 'r') as postlog:
-                            for line in postlog.readlines():
-                                month, day, time, year, __, __, __, list_name, __, __, size = line.split()[:11]
-                                try:
-                                    list = lists[list_name]
-                                except KeyError:
-                                    continue
-                                else:
-                                    date = year + months[month] + day + time.replace(':', '')
-                                    if list[0] < int(date) < end_date:
-                                        size = size[5:-1]
-                                        try:
-                                            list[2] += int(size)
-                                        except ValueError:
-                                            # anonymized post
-                                            pass
-                    except IOError as e:
-                        sys.stderr.write(e)
+                        list = lists[list_name]
+                    except KeyError:
+                        continue
+                    else:
+                        date = year + months[month] + day + time.replace(':', '')
+                        if list[0] < int(date) < end_date:
+                            size = size[5:-1]
+                            try:
+                                list[2] += int(size)
+                            except ValueError:
+                                # anonymized post
+                                pass
                 
                 for list_name, opts in lists.items():
                     __, object_id, size = opts
@@ -255,7 +255,8 @@ class MailmanTraffic(ServiceMonitor):
         self.append("prepare(%(object_id)s, '%(list_name)s', '%(last_date)s')" % context)
     
     def commit(self):
-        self.append('monitor(lists, end_date, months, postlogs)')
+        self.append('monitor(lists, end_date, months, postlog)')
+        self.append('commit_logs()')
     
     def get_context(self, mail_list):
         context = {
@@ -357,10 +357,12 @@ class PostfixMailscannerTraffic(ServiceMonitor):
     )
     
     def prepare(self):
+        self.prefetch_last_dates()
+        self.append(self.get_log_reader())
         mail_log = settings.MAILBOXES_MAIL_LOG_PATH
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'mail_logs': str((mail_log, mail_log+'.1')),
+            'mail_log': mail_log,
         }
         self.append(textwrap.dedent("""\
             import re
@@ -375,9 +377,12 @@ class PostfixMailscannerTraffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            maillogs = {mail_logs}
+            maillog = '{mail_log}'
             end_datetime = to_local_timezone('{current_date}')
             end_date = int(end_datetime.strftime('%Y%m%d%H%M%S'))
+            if incremental:
+                # Lines are only read once, the ones logged after current_date can not be left behind
+                end_date = 99999999999999
             months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
             months = dict((m, '%02d' % n) for n, m in enumerate(months, 1))
             
@@ -409,66 +414,61 @@ class PostfixMailscannerTraffic(ServiceMonitor):
                 delivers[mailbox] = set()
                 reverse[mailbox] = set()
             
-            def monitor(users, delivers, reverse, maillogs):
+            def monitor(users, delivers, reverse, maillog):
                 targets = {{}}
                 counter = {{}}
                 user_regex = re.compile(r'\(Authenticated sender: ([^ ]+)\)')
-                for maillog in maillogs:
-                    try:
-                        with open(maillog, 'r') as maillog:
-                            for line in maillog.readlines():
-                                # Only search for Authenticated sendings
-                                if '(Authenticated sender: ' in line:
-                                    username = user_regex.search(line).groups()[0]
-                                    try:
-                                        sender = users[username]
-                                    except KeyError:
-                                        continue
-                                    else:
-                                        month, day, time, __, proc, id = line.split()[:6]
-                                        if inside_period(month, day, time, sender[0]):
-                                            # Add new email
-                                            delivers[id[:-1]] = username
-                                # Look for a MailScanner requeue ID
-                                elif ' Requeue: ' in line:
-                                    id, __, req_id = line.split()[6:9]
-                                    id = id.split('.')[0]
-                                    try:
-                                        username = delivers[id]
-                                    except KeyError:
-                                        pass
-                                    else:
-                                        targets[req_id] = (username, 0)
-                                        reverse[username].add(req_id)
-                                # Look for the mail size and count the number of recipients of each email
+                for line in readlines(maillog):
+                    # Only search for Authenticated sendings
+                    if '(Authenticated sender: ' in line:
+                        username = user_regex.search(line).groups()[0]
+                        try:
+                            sender = users[username]
+                        except KeyError:
+                            continue
+                        else:
+                            month, day, time, __, proc, id = line.split()[:6]
+                            if inside_period(month, day, time, sender[0]):
+                                # Add new email
+                                delivers[id[:-1]] = username
+                    # Look for a MailScanner requeue ID
+                    elif ' Requeue: ' in line:
+                        id, __, req_id = line.split()[6:9]
+                        id = id.split('.')[0]
+                        try:
+                            username = delivers[id]
+                        except KeyError:
+                            pass
+                        else:
+                            targets[req_id] = (username, 0)
+                            reverse[username].add(req_id)
+                    # Look for the mail size and count the number of recipients of each email
+                    else:
+                        try:
+                            month, day, time, __, proc, req_id, __, msize = line.split()[:8]
+                        except ValueError:
+                            # not interested in this line
+                            continue
+                        if proc.startswith('postfix/'):
+                            req_id = req_id[:-1]
+                            if msize.startswith('size='):
+                                try:
+                                    target = targets[req_id]
+                                except KeyError:
+                                    pass
                                 else:
-                                    try:
-                                        month, day, time, __, proc, req_id, __, msize = line.split()[:8]
-                                    except ValueError:
-                                        # not interested in this line
-                                        continue
-                                    if proc.startswith('postfix/'):
-                                        req_id = req_id[:-1]
-                                        if msize.startswith('size='):
-                                            try:
-                                                target = targets[req_id]
-                                            except KeyError:
-                                                pass
-                                            else:
-                                                targets[req_id] = (target[0], int(msize[5:-1]))
-                                        elif proc.startswith('postfix/smtp'):
-                                            try:
-                                                target = targets[req_id]
-                                            except KeyError:
-                                                pass
-                                            else:
-                                                if inside_period(month, day, time, users[target[0]][0]):
-                                                    try:
-                                                        counter[req_id] += 1
-                                                    except KeyError:
-                                                        counter[req_id] = 1
-                    except IOError as e:
-                        sys.stderr.write(e)
+                                    targets[req_id] = (target[0], int(msize[5:-1]))
+                            elif proc.startswith('postfix/smtp'):
+                                try:
+                                    target = targets[req_id]
+                                except KeyError:
+                                    pass
+                                else:
+                                    if inside_period(month, day, time, users[target[0]][0]):
+                                        try:
+                                            counter[req_id] += 1
+                                        except KeyError:
+                                            counter[req_id] = 1
                     
                 for username, opts in users.iteritems():
                     size = 0
@@ -479,7 +479,8 @@ class PostfixMailscannerTraffic(ServiceMonitor):
         )
     
     def commit(self):
-        self.append('monitor(users, delivers, reverse, maillogs)')
+        self.append('monitor(users, delivers, reverse, maillog)')
+        self.append('commit_logs()')
     
     def monitor(self, mailbox):
         context = self.get_context(mailbox)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def index_forward_mailboxes(apps, schema_editor):
+    Address = apps.get_model('mailboxes', 'Address')
+    Mailbox = apps.get_model('mailboxes', 'Mailbox')
+    ForwardMailbox = Address.forward_mailboxes.through
+    mailboxes = dict(Mailbox.objects.values_list('name', 'pk'))
+    rows = []
+    for address_id, forward in Address.objects.exclude(forward='').values_list('pk', 'forward'):
+        for name in set(forward.split()):
+            if name in mailboxes:
+                rows.append(ForwardMailbox(address_id=address_id, mailbox_id=mailboxes[name]))
+    ForwardMailbox.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('mailboxes', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='forward_mailboxes',
+            field=models.ManyToManyField(verbose_name='forward mailboxes', to='mailboxes.Mailbox', blank=True, editable=False, related_name='forwarding_addresses'),
+        ),
+        migrations.RunPython(index_forward_mailboxes, migrations.RunPython.noop),
+    ]
@@ -65,11 +65,13 @@ class Mailbox(models.Model):
         return (name, content)
     
     def delete(self, *args, **kwargs):
+        # Forwarding addresses are looked up before the forward_mailboxes rows get deleted
+        addresses = list(self.forwarding_addresses.all())
         super(Mailbox, self).delete(*args, **kwargs)
         # Cleanup related addresses
-        for address in Address.objects.filter(forward__regex=r'.*(^|\s)+%s($|\s)+.*' % self.name):
-            forward = address.forward.split()
-            forward.remove(self.name)
+        for address in addresses:
+            # forward may no longer name this mailbox, i.e. it has been renamed since
+            forward = [name for name in address.forward.split() if name != self.name]
             address.forward = ' '.join(forward)
             if not address.destination:
                 address.delete()
@@ -93,6 +95,9 @@ class Address(models.Model):
     forward = models.CharField(_("forward"), max_length=256, blank=True,
         validators=[validators.validate_forward],
         help_text=_("Space separated email addresses or mailboxes"))
+    # Index of the mailboxes named on forward, maintained on save
+    forward_mailboxes = models.ManyToManyField(Mailbox, verbose_name=_("forward mailboxes"),
+        related_name='forwarding_addresses', blank=True, editable=False)
     account = models.ForeignKey('accounts.Account', verbose_name=_("Account"),
         related_name='addresses')
     
@@ -127,13 +132,31 @@ class Address(models.Model):
                     'forward': forward_errors
                 })
     
+    def save(self, *args, **kwargs):
+        super(Address, self).save(*args, **kwargs)
+        self.update_forward_mailboxes()
+    
+    def update_forward_mailboxes(self):
+        """ synchronizes forward_mailboxes with the mailbox names of forward """
+        names = [forward for forward in self.forward.split() if '@' not in forward]
+        mailboxes = set()
+        if names:
+            mailboxes = set(Mailbox.objects.filter(name__in=names).values_list('pk', flat=True))
+        current = set(self.forward_mailboxes.values_list('pk', flat=True))
+        if current - mailboxes:
+            self.forward_mailboxes.remove(*(current - mailboxes))
+        if mailboxes - current:
+            self.forward_mailboxes.add(*(mailboxes - current))
+    
     def get_forward_mailboxes(self):
-        for forward in self.forward.split():
-            if '@' not in forward:
-                try:
-                    yield Mailbox.objects.get(name=forward)
-                except Mailbox.DoesNotExist:
-                    pass
+        names = [forward for forward in self.forward.split() if '@' not in forward]
+        if names:
+            mailboxes = {
+                mailbox.name: mailbox for mailbox in Mailbox.objects.filter(name__in=names)
+            }
+            for name in names:
+                if name in mailboxes:
+                    yield mailboxes[name]
     
     def get_mailboxes(self):
         for mailbox in self.mailboxes.all():
@@ -28,6 +28,9 @@ def validate_forward(value):
     from .models import Mailbox
     errors = []
     destinations = []
+    names = [destination for destination in value.split() if '@' not in destination]
+    if names:
+        names = set(Mailbox.objects.filter(name__in=names).values_list('name', flat=True))
     for destination in value.split():
         if destination in destinations:
             errors.append(ValidationError(
@@ -41,7 +44,7 @@ def validate_forward(value):
                 errors.append(ValidationError(
                     _("'%s' is not a valid email address.") % destination
                 ))
-        elif not Mailbox.objects.filter(name=destination).exists():
+        elif destination not in names:
             errors.append(ValidationError(
                 _("'%s' is not an existent mailbox.") % destination
             ))
@@ -1,6 +1,6 @@
 import copy
 
-from .backends import ServiceBackend, ServiceController, replace
+from .backends import ServiceBackend, ServiceController, render_template, replace
 
 
 class Operation():
@@ -24,11 +24,27 @@ class Operation():
     def __init__(self, backend, instance, action, servers=None):
         self.backend = backend
         # instance should maintain any dynamic attribute until backend execution
-        # deep copy is prefered over copy otherwise objects will share same atributes (queryset cache)
-        self.instance = copy.deepcopy(instance)
+        self.instance = self.snapshot(instance)
         self.action = action
         self.servers = servers
     
+    @staticmethod
+    def snapshot(instance):
+        """
+        Lightweight copy of instance, much cheaper than copy.deepcopy()
+        Field values and dynamic attributes are copied (pk survives deletion), and the
+        prefetched querysets cache gets its own dict so objects do not share the same attributes.
+        Related objects cached on _<field>_cache attributes are shared with instance, changes
+        made to them after the operation has been collected are seen by its backends.
+        """
+        snapshot = instance.__class__.__new__(instance.__class__)
+        snapshot.__dict__ = instance.__dict__.copy()
+        snapshot._state = copy.copy(instance._state)
+        prefetched = instance.__dict__.get('_prefetched_objects_cache')
+        if prefetched is not None:
+            snapshot._prefetched_objects_cache = prefetched.copy()
+        return snapshot
+    
     @classmethod
     def execute(cls, operations, async=False):
         from . import manager
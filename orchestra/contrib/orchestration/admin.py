@@ -116,6 +116,13 @@ def display_mono(field):
     return display
 
 
+def display_output(stream):
+    def display(self, log):
+        return monospace_format(escape(log.get_output(stream)))
+    display.short_description = _(stream)
+    return display
+
+
 class BackendLogAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'backend', 'server_link', 'display_state', 'exit_code',
@@ -135,8 +142,8 @@ class BackendLogAdmin(admin.ModelAdmin):
     display_created = admin_date('created_at', short_description=_("Created"))
     display_state = admin_colored('state', colors=STATE_COLORS)
     mono_script = display_mono('script')
-    mono_stdout = display_mono('stdout')
-    mono_stderr = display_mono('stderr')
+    mono_stdout = display_output('stdout')
+    mono_stderr = display_output('stderr')
     mono_traceback = display_mono('traceback')
     
     def get_queryset(self, request):
@@ -0,0 +1,286 @@
+"""
+Orchestra agent, long-lived process that executes backend scripts on a managed server
+
+It only depends on the Python standard library and supports Python 2.7 and 3, since its
+source is streamed to the managed servers and executed there with ORCHESTRATION_AGENT_PYTHON.
+
+Requests and responses are JSON frames, each one prefixed by its size and a newline
+    request: {"id": 1, "method": "run", "executable": "/bin/bash", "script": "...", "key": "Backend"}
+    output: {"id": 1, "stream": "stdout", "data": "..."}
+    end: {"id": 1, "exit_code": 0} or {"id": 1, "error": "..."}
+
+Scripts meant for the same Python interpreter the agent is running on are executed in-process,
+so imported modules stay warm between runs and every script gets the agent_state dictionary
+of its key, preserved across executions. Other scripts run on a subprocess.
+    
+    python agent.py                       speaks the protocol over stdin and stdout
+    python agent.py --socket /tmp/agent   listens on a unix socket, for testing
+"""
+import codecs
+import json
+import os
+import select
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+
+
+class AgentError(Exception):
+    pass
+
+
+def write_frame(stream, message):
+    payload = json.dumps(message).encode('ascii')
+    stream.write(('%i\n' % len(payload)).encode('ascii') + payload)
+    stream.flush()
+
+
+def read_frame(stream):
+    """ Returns the next message of stream or None when it has been closed """
+    header = stream.readline()
+    if not header:
+        return None
+    size = int(header)
+    payload = b''
+    while len(payload) < size:
+        data = stream.read(size-len(payload))
+        if not data:
+            raise AgentError("Connection closed while reading a %i bytes frame." % size)
+        payload += data
+    return json.loads(payload.decode('utf-8'))
+
+
+class OutputStream(object):
+    """ File-like object sending what is written to it as output frames of request_id """
+    def __init__(self, wfile, request_id, stream, buffer_size=4096):
+        self.wfile = wfile
+        self.request_id = request_id
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.buffer = []
+        self.size = 0
+    
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = self.decoder.decode(data)
+        if data:
+            self.buffer.append(data)
+            self.size += len(data)
+            if self.size >= self.buffer_size:
+                self.flush()
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        if self.buffer:
+            write_frame(self.wfile, {
+                'id': self.request_id,
+                'stream': self.stream,
+                'data': ''.join(self.buffer),
+            })
+            self.buffer = []
+            self.size = 0
+    
+    def isatty(self):
+        return False
+
+
+class Agent(object):
+    def __init__(self, tmp_dir=None):
+        self.tmp_dir = tmp_dir
+        self.state = {}
+        self.runs = 0
+        # In-process executions swap sys.stdout and sys.stderr
+        self.lock = threading.Lock()
+    
+    def serve(self, rfile, wfile):
+        """ Handles the requests of one client until it closes the connection """
+        while True:
+            request = read_frame(rfile)
+            if request is None:
+                return
+            request_id = request.get('id')
+            handler = getattr(self, 'do_%s' % request.get('method'), None)
+            if handler is None:
+                write_frame(wfile, {
+                    'id': request_id,
+                    'error': "Unknown method '%s'." % request.get('method'),
+                })
+                continue
+            with self.lock:
+                try:
+                    response = handler(request, wfile)
+                except Exception:
+                    response = {
+                        'error': traceback.format_exc(),
+                    }
+            response['id'] = request_id
+            write_frame(wfile, response)
+    
+    def do_ping(self, request, wfile):
+        return {
+            'result': 'pong',
+            'pid': os.getpid(),
+            'runs': self.runs,
+        }
+    
+    def do_run(self, request, wfile):
+        executable = request['executable']
+        stdout = OutputStream(wfile, request['id'], 'stdout')
+        stderr = OutputStream(wfile, request['id'], 'stderr')
+        if os.path.realpath(executable) == os.path.realpath(sys.executable):
+            exit_code = self.run_python(request['script'], request.get('key'), stdout, stderr)
+        else:
+            exit_code = self.run_process(executable, request['script'], stdout, stderr)
+        stdout.flush()
+        stderr.flush()
+        self.runs += 1
+        return {
+            'exit_code': exit_code,
+        }
+    
+    def run_python(self, script, key, stdout, stderr):
+        namespace = {
+            '__name__': '__main__',
+            'agent_state': self.state.setdefault(key, {}),
+        }
+        code = compile(script, '<%s>' % (key or 'script'), 'exec')
+        streams = (sys.stdout, sys.stderr)
+        sys.stdout, sys.stderr = stdout, stderr
+        try:
+            exec(code, namespace)
+        except SystemExit as exc:
+            if exc.code is None:
+                return 0
+            if isinstance(exc.code, int):
+                return exc.code
+            stderr.write('%s\n' % exc.code)
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+        finally:
+            sys.stdout, sys.stderr = streams
+        return 0
+    
+    def run_process(self, executable, script, stdout, stderr):
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            os.write(fd, script.encode('utf-8'))
+            os.close(fd)
+            with open(os.devnull, 'rb') as devnull:
+                process = subprocess.Popen([executable, path], stdin=devnull,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+            streams = {
+                process.stdout.fileno(): stdout,
+                process.stderr.fileno(): stderr,
+            }
+            while streams:
+                for fileno in select.select(list(streams), [], [])[0]:
+                    data = os.read(fileno, 65536)
+                    if data:
+                        streams[fileno].write(data)
+                        streams[fileno].flush()
+                    else:
+                        streams.pop(fileno)
+            return process.wait()
+        finally:
+            os.remove(path)
+    
+    def serve_socket(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(5)
+        while True:
+            client = server.accept()[0]
+            thread = threading.Thread(target=self.serve_connection, args=(client,))
+            thread.daemon = True
+            thread.start()
+    
+    def serve_connection(self, client):
+        try:
+            self.serve(client.makefile('rb'), client.makefile('wb'))
+        finally:
+            client.close()
+
+
+class AgentClient(object):
+    """ Client side of the protocol, over any pair of binary file objects """
+    def __init__(self, rfile, wfile, channel=None):
+        self.rfile = rfile
+        self.wfile = wfile
+        # Underlying SSH channel or socket, closed along with the client
+        self.channel = channel
+        self.counter = 0
+    
+    @classmethod
+    def connect(cls, path):
+        """ Client of the agent listening on the unix socket path """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        return cls(sock.makefile('rb'), sock.makefile('wb'), channel=sock)
+    
+    def request(self, method, **kwargs):
+        """ Yields the response frames of the request, the last one is the final response """
+        self.counter += 1
+        kwargs.update({
+            'id': self.counter,
+            'method': method,
+        })
+        write_frame(self.wfile, kwargs)
+        while True:
+            response = read_frame(self.rfile)
+            if response is None:
+                raise AgentError("Agent connection closed before responding.")
+            if response.get('id') != self.counter:
+                raise AgentError("Unexpected response %s." % response.get('id'))
+            if 'error' in response:
+                raise AgentError(response['error'])
+            yield response
+            if 'stream' not in response:
+                return
+    
+    def ping(self):
+        return list(self.request('ping'))[-1]
+    
+    def run(self, executable, script, key=None, write=None):
+        """ Executes script and returns its exit code, write(stream, data) is called with its output """
+        for response in self.request('run', executable=executable, script=script, key=key):
+            if 'stream' not in response:
+                return response['exit_code']
+            if write is not None:
+                write(response['stream'], response['data'])
+    
+    def close(self):
+        for handle in (self.rfile, self.wfile, self.channel):
+            if handle is not None:
+                try:
+                    handle.close()
+                except Exception:
+                    pass
+
+
+def main(argv):
+    if len(argv) == 3 and argv[1] == '--socket':
+        Agent().serve_socket(argv[2])
+        return
+    # Frames are exchanged over private copies of stdin and stdout, stray writes
+    # of executed scripts and their children are redirected to stderr
+    rfile = os.fdopen(os.dup(0), 'rb')
+    wfile = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+    Agent().serve(rfile, wfile)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
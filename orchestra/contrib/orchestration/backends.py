@@ -1,7 +1,10 @@
 import re
+import textwrap
 from functools import partial
 
 from django.apps import apps
+from django.db.models.query import prefetch_related_objects
+from django.template import Context, Template
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
@@ -18,6 +21,21 @@ def replace(context, pattern, repl):
     return context
 
 
+_templates = {}
+
+
+def render_template(source, context):
+    """
+    Renders the django template source with context, dedenting it first.
+    Compiled templates are cached by source, so config templates are only parsed once per process
+    """
+    try:
+        template = _templates[source]
+    except KeyError:
+        template = _templates[source] = Template(textwrap.dedent(source))
+    return template.render(Context(context))
+
+
 class ServiceMount(plugins.PluginMount):
     def __init__(cls, name, bases, attrs):
         # Make sure backends specify a model attribute
@@ -36,8 +54,12 @@ class ServiceBackend(plugins.Plugin, metaclass=ServiceMount):
     """
     model = None
     related_models = ()  # ((model, accessor__attribute),)
+    # Related lookups used while generating the scripts, prefetched for all instances at once
+    prefetch_related = ()
     script_method = methods.SSH
     script_executable = '/bin/bash'
+    # Stream the script through stdin, False uploads it with SCP before execution
+    script_stdin = True
     function_method = methods.Python
     type = 'task'  # 'sync'
     ignore_fields = []
@@ -64,6 +86,7 @@ class ServiceBackend(plugins.Plugin, metaclass=ServiceMount):
             'tail',
             'content',
             'script_method',
+            'script_stdin',
             'function_method'
         )
         if attr == 'prepare':
@@ -93,12 +116,47 @@ class ServiceBackend(plugins.Plugin, metaclass=ServiceMount):
         model = '%s.%s' % (opts.app_label, opts.object_name)
         for rel_model, field in cls.related_models:
             if rel_model == model:
-                related = obj
-                for attribute in field.split('__'):
-                    related = getattr(related, attribute)
-                return related
+                return cls.follow_related(obj, field)
         return None
     
+    @classmethod
+    def prefetch(cls, instances):
+        """ Loads the prefetch_related lookups of all instances with one query per lookup """
+        if cls.prefetch_related and instances:
+            prefetch_related_objects(instances, cls.prefetch_related)
+    
+    @staticmethod
+    def follow_related(obj, field):
+        related = obj
+        for attribute in field.split('__'):
+            related = getattr(related, attribute)
+        return related
+    
+    @classmethod
+    def get_model_index(cls):
+        """
+        {model label: [(backend, accessor), ...]} index of all backends, in registration order
+        accessor is None when the model is the backend main model.
+        Rebuilt when new backends get registered.
+        """
+        plugins = ServiceBackend.get_plugins()
+        index = ServiceBackend.__dict__.get('_model_index')
+        if index is None or index[0] != len(plugins):
+            models = {}
+            for backend in plugins:
+                labels = set()
+                if backend.model:
+                    models.setdefault(backend.model, []).append((backend, None))
+                    labels.add(backend.model)
+                for rel_model, field in backend.related_models:
+                    # Like get_related(), only the first accessor of each model is used
+                    if rel_model not in labels:
+                        models.setdefault(rel_model, []).append((backend, field))
+                        labels.add(rel_model)
+            index = (len(plugins), models)
+            ServiceBackend._model_index = index
+        return index[1]
+    
     @classmethod
     def get_backends(cls, instance=None, action=None):
         backends = cls.get_plugins()
@@ -144,13 +202,18 @@ class ServiceBackend(plugins.Plugin, metaclass=ServiceMount):
         time = timezone.now().strftime("%h %d, %Y %I:%M:%S %Z")
         return "Generated by Orchestra at %s" % time
     
-    def execute(self, server, async=False):
+    def execute(self, server, async=False, log=None):
+        """ log: previously persisted BackendLog, used for queued executions """
         from .models import BackendLog
         scripts = self.scripts
         state = BackendLog.STARTED
         if not scripts:
             state = BackendLog.SUCCESS
-        log = BackendLog.objects.create(backend=self.get_name(), state=state, server=server)
+        if log is None:
+            log = BackendLog.objects.create(backend=self.get_name(), state=state, server=server)
+        elif log.state != state:
+            log.state = state
+            log.save(update_fields=['state'])
         for method, commands in scripts:
             method(log, server, commands, async)
             if log.state != BackendLog.SUCCESS:
@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from . import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Task(object):
+    """ Unit of work submitted to the executor, func(*args, **kwargs) executed against server """
+    def __init__(self, server, func, args, kwargs, timeout=None):
+        self.server = server
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+        # Timed out while running, its result is discarded
+        self.abandoned = False
+        self.event = threading.Event()
+    
+    def __str__(self):
+        return '%s@%s' % (getattr(self.func, '__name__', self.func), self.server)
+    
+    @property
+    def done(self):
+        return self.event.is_set()
+    
+    @property
+    def wait_time(self):
+        return (self.started_at or time.time()) - self.queued_at
+    
+    def run(self):
+        try:
+            self.func(*self.args, **self.kwargs)
+        except Exception as exc:
+            logger.error('Exception while executing task %s: %s' % (self, exc))
+        finally:
+            self.finished_at = time.time()
+            self.event.set()
+    
+    def join(self):
+        """
+        Waits for the task to finish, at most timeout seconds since it was submitted
+        returns False when the task has timed out
+        """
+        if self.timeout is None:
+            self.event.wait()
+            return True
+        remaining = self.queued_at + self.timeout - time.time()
+        return self.event.wait(max(remaining, 0))
+
+
+class BackendExecutor(object):
+    """
+    Bounded pool of worker threads with a per-server concurrency limit
+    
+    Tasks are queued per server and dispatched round-robin across servers, so one server
+    with a large backlog does not starve the others. Worker threads are spawned on demand
+    up to max_workers and exit after being idle for idle_timeout seconds.
+    """
+    def __init__(self, max_workers=None, max_per_server=None, idle_timeout=60):
+        self.max_workers = max_workers or settings.ORCHESTRATION_MAX_WORKERS
+        self.max_per_server = max_per_server or settings.ORCHESTRATION_MAX_WORKERS_PER_SERVER
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.reset()
+    
+    def reset(self):
+        """ Worker threads do not survive a fork """
+        self.pid = os.getpid()
+        self.queues = OrderedDict()
+        self.running = {}
+        self.workers = 0
+        self.idle = 0
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'cancelled': 0,
+            'abandoned': 0,
+            'max_queue_depth': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+    
+    @property
+    def queue_depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats.update({
+                'queue_depth': self.queue_depth,
+                'running': sum(self.running.values()),
+                'workers': self.workers,
+            })
+        started = stats['completed'] + stats['running']
+        stats['avg_wait_time'] = stats['wait_time']/started if started else 0.0
+        return stats
+    
+    def submit(self, server, func, *args, **kwargs):
+        timeout = kwargs.pop('timeout', settings.ORCHESTRATION_TASK_TIMEOUT)
+        task = Task(server, func, args, kwargs, timeout=timeout)
+        with self.condition:
+            if self.pid != os.getpid():
+                self.reset()
+            self.queues.setdefault(server, deque()).append(task)
+            self.stats['submitted'] += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue_depth)
+            # Idle workers take one task each, the rest of the backlog needs new workers
+            if self.queue_depth > self.idle and self.workers < self.max_workers:
+                self.workers += 1
+                thread = threading.Thread(target=self.work, name='orchestration-worker')
+                thread.daemon = True
+                thread.start()
+            self.condition.notify()
+        return task
+    
+    def cancel(self, task):
+        """
+        Prevents a queued task from being started, returns False when it already has.
+        Running tasks are marked as abandoned, callers should discard their result.
+        """
+        with self.lock:
+            if task.cancelled or task.done:
+                return False
+            if task.started_at is None:
+                task.cancelled = True
+                self.queues[task.server].remove(task)
+                if not self.queues[task.server]:
+                    self.queues.pop(task.server)
+                self.stats['cancelled'] += 1
+                task.event.set()
+                return True
+            if not task.abandoned:
+                task.abandoned = True
+                self.stats['abandoned'] += 1
+        return False
+    
+    def get_task(self):
+        """ Next task of the first server below its concurrency limit, round-robin """
+        for server, queue in self.queues.items():
+            if self.running.get(server, 0) < self.max_per_server:
+                task = queue.popleft()
+                if queue:
+                    # Move server to the back of the line
+                    self.queues.move_to_end(server)
+                else:
+                    self.queues.pop(server)
+                return task
+        return None
+    
+    def work(self):
+        while True:
+            with self.condition:
+                task = self.get_task()
+                while task is None:
+                    self.idle += 1
+                    notified = self.condition.wait(self.idle_timeout)
+                    self.idle -= 1
+                    task = self.get_task()
+                    if task is None and not notified:
+                        self.workers -= 1
+                        return
+                task.started_at = time.time()
+                self.running[task.server] = self.running.get(task.server, 0) + 1
+                self.stats['wait_time'] += task.wait_time
+                self.stats['max_wait_time'] = max(self.stats['max_wait_time'], task.wait_time)
+            try:
+                task.run()
+            finally:
+                with self.condition:
+                    self.running[task.server] -= 1
+                    if not self.running[task.server]:
+                        self.running.pop(task.server)
+                    self.stats['completed'] += 1
+                    # A slot for this server has been released
+                    self.condition.notify()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """ Process-wide executor, shared by all the requests """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = BackendExecutor()
+    return _executor
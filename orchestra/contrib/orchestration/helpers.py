@@ -71,7 +71,7 @@ def send_report(method, args, log):
 
 
 def message_user(request, logs):
-    total, successes = 0, 0
+    total, successes, queued = 0, 0, 0
     ids = []
     for log in logs:
         total += 1
@@ -80,7 +80,9 @@ def message_user(request, logs):
             ids.append(log.pk)
         if log.state == log.SUCCESS:
             successes += 1
-    errors = total-successes
+        elif log.state in (log.RECEIVED, log.STARTED):
+            queued += 1
+    errors = total-successes-queued
     if len(ids) == 1:
         url = reverse('admin:orchestration_backendlog_change', args=ids)
         href = '<a href="{}">backends</a>'.format(url)
@@ -96,6 +98,12 @@ def message_user(request, logs):
             _('{errors} out of {total} {href} have fail to execute.'),
             errors)
         messages.error(request, mark_safe(msg.format(errors=errors, total=total, href=href)))
+    elif queued:
+        msg = ungettext(
+            _('{queued} out of {total} {href} has been queued for execution.'),
+            _('{queued} out of {total} {href} have been queued for execution.'),
+            queued)
+        messages.info(request, mark_safe(msg.format(queued=queued, total=total, href=href)))
     else:
         msg = ungettext(
             _('{total} {href} has been executed.'),
@@ -1,6 +1,6 @@
 import logging
-import threading
 import traceback
+import uuid
 from collections import OrderedDict
 
 from django import db
@@ -10,6 +10,7 @@ from orchestra.utils.python import import_class, OrderedSet
 
 from . import settings, Operation
 from .backends import ServiceBackend
+from .executor import get_executor
 from .helpers import send_report
 from .models import BackendLog
 from .signals import pre_action, post_action
@@ -60,6 +61,13 @@ def generate(operations):
     scripts = OrderedDict()
     cache = {}
     block = False
+    # Load the related objects required by each backend in one pass, instead of per instance
+    instances = OrderedDict()
+    for operation in operations:
+        if operation.action == Operation.SAVE:
+            instances.setdefault(operation.backend, []).append(operation.instance)
+    for backend_cls, backend_instances in instances.items():
+        backend_cls.prefetch(backend_instances)
     # Generate scripts per server+backend
     for operation in operations:
         logger.debug("Queued %s" % str(operation))
@@ -98,28 +106,35 @@ def execute(scripts, block=False, async=False):
         logger.info('Orchestration execution is dissabled by ORCHESTRATION_DISABLE_EXECUTION settings.')
         return []
     # Execute scripts on each server
-    threads = []
+    executor = get_executor()
+    tasks = []
     executions = []
     for key, value in scripts.items():
         server, __ = key
         backend, operations = value
         execute = as_task(backend.execute)
         logger.debug('%s is going to be executed on %s' % (backend, server))
+        task = None
         if block:
             # Execute one backend at a time, no need for threads
             execute(server, async=async)
         else:
-            execute = close_connection(execute)
-            thread = threading.Thread(target=execute, args=(server,), kwargs={'async': async})
-            thread.start()
-            threads.append(thread)
-        executions.append((execute, operations))
-    [ thread.join() for thread in threads ]
+            task = executor.submit(server, close_connection(execute), server, async=async)
+            tasks.append(task)
+        executions.append((execute, operations, task))
+    for task in tasks:
+        if not task.join():
+            # Backends still running by now are abandoned, their log may still be written
+            executor.cancel(task)
+            logger.error('%s has timed out after %s seconds' % (task, task.timeout))
+    logger.debug('Executor stats %s' % executor.get_stats())
     logs = []
     # collect results
-    for execution, operations in executions:
+    for execution, operations, task in executions:
+        if task is not None and (task.abandoned or task.cancelled):
+            logs.append(BackendLog(state=BackendLog.TIMEOUT))
         # There is no log if an exception has been rised at the very end of the execution
-        if hasattr(execution, 'log'):
+        elif hasattr(execution, 'log'):
             for operation in operations:
                 logger.info("Executed %s" % str(operation))
                 if operation.instance.pk:
@@ -136,18 +151,61 @@ def execute(scripts, block=False, async=False):
     return logs
 
 
+def is_queueable(backend):
+    """ only plain scripts can be persisted, function commands have to be executed in-process """
+    scripts = backend.scripts
+    return bool(scripts) and all(method == backend.script_method for method, __ in scripts)
+
+
+def enqueue(scripts, block=False):
+    """
+    Persists the generated scripts as RECEIVED logs and queues them for execution
+    on the celery workers, returning without waiting for them.
+    Blocking backends and scripts with function commands are executed right away.
+    """
+    from .tasks import execute_log
+    if settings.ORCHESTRATION_DISABLE_EXECUTION:
+        logger.info('Orchestration execution is dissabled by ORCHESTRATION_DISABLE_EXECUTION settings.')
+        return []
+    logs = []
+    local = OrderedDict()
+    for key, value in scripts.items():
+        server, __ = key
+        backend, operations = value
+        if block or not is_queueable(backend):
+            local[key] = value
+            continue
+        method, commands = backend.scripts[0]
+        task_id = str(uuid.uuid4())
+        log = BackendLog.objects.create(backend=backend.get_name(), server=server,
+            state=BackendLog.RECEIVED, script='\n'.join(commands), task_id=task_id)
+        for operation in operations:
+            logger.info("Queued %s" % str(operation))
+            if operation.instance.pk:
+                # Not all backends are called with objects saved on the database
+                operation.store(log)
+        execute_log.apply_async((log.pk,), task_id=task_id)
+        logs.append(log)
+    if local:
+        logs += execute(local, block=block)
+    return logs
+
+
 def collect(instance, action, **kwargs):
     """ collect operations """
     operations = kwargs.get('operations', OrderedSet())
     route_cache = kwargs.get('route_cache', {})
-    for backend_cls in ServiceBackend.get_backends():
+    opts = instance._meta
+    model = '%s.%s' % (opts.app_label, opts.object_name)
+    # Models without backends short-circuit here
+    for backend_cls, accessor in ServiceBackend.get_model_index().get(model, ()):
         # Check if there exists a related instance to be executed for this backend and action
         instances = []
         if action in backend_cls.actions:
-            if backend_cls.is_main(instance):
+            if accessor is None:
                 instances = [(instance, action)]
             else:
-                candidate = backend_cls.get_related(instance)
+                candidate = backend_cls.follow_related(instance, accessor)
                 if candidate:
                     if candidate.__class__.__name__ == 'ManyRelatedManager':
                         if 'pk_set' in kwargs:
@@ -1,4 +1,5 @@
 import hashlib
+import inspect
 import json
 import logging
 import os
@@ -12,20 +13,81 @@ from django.conf import settings as djsettings
 
 from orchestra.utils.python import CaptureStdout
 
-from . import settings
+from . import agent, settings
+from .sinks import LogSink
+from .ssh import pool
 
 
 logger = logging.getLogger(__name__)
 
-transports = {}
+
+def get_stdin_cmd(backend, bscript, digest):
+    """
+    Remote command that reads a script frame from stdin and executes it
+    
+    The frame is the exact script size and its md5 digest, the whole script is read before
+    execution so commands that read from stdin can not consume it.
+    """
+    context = {
+        'executable': backend.script_executable,
+        'size': len(bscript),
+        'digest': digest,
+    }
+    return (
+        # Trailing dot keeps command substitution from stripping trailing newlines
+        "SCRIPT=$(head -c %(size)s; echo .)\n"
+        "SCRIPT=${SCRIPT%%.}\n"
+        "if [[ $(printf '%%s' \"$SCRIPT\"|md5sum|awk {'print $1'}) != %(digest)s ]]; then\n"
+        "    echo 'Script integrity check failed, %(size)s bytes expected' >&2\n"
+        "    exit 255\n"
+        "fi\n"
+        "%(executable)s <(printf '%%s' \"$SCRIPT\") < /dev/null\n"
+        "exit $?" % context
+    )
+
+
+def get_file_cmd(backend, remote_path, digest):
+    """ Remote command that validates and executes an already uploaded script """
+    context = {
+        'executable': backend.script_executable,
+        'remote_path': remote_path,
+        'digest': digest,
+        'remove': '' if djsettings.DEBUG else "rm -fr %s\n" % remote_path,
+    }
+    return (
+        "[[ $(md5sum %(remote_path)s|awk {'print $1'}) == %(digest)s ]] && %(executable)s %(remote_path)s\n"
+        "RETURN_CODE=$?\n"
+        "%(remove)s"
+        "exit $RETURN_CODE" % context
+    )
+
+
+def get_agent_cmd(source):
+    """ Remote command that reads the agent source from stdin and runs it """
+    context = {
+        'python': settings.ORCHESTRATION_AGENT_PYTHON,
+        'size': len(source),
+    }
+    return 'exec %(python)s -u -c "$(head -c %(size)s)"' % context
+
+
+def start_agent(connection):
+    """ Starts a new agent on a channel of connection and returns its client """
+    source = inspect.getsource(agent).encode('utf-8')
+    channel = connection.transport.open_session()
+    channel.exec_command(get_agent_cmd(source))
+    channel.sendall(source)
+    return agent.AgentClient(channel.makefile('rb', -1), channel.makefile('wb', -1), channel=channel)
 
 
 def SSH(backend, log, server, cmds, async=False):
     """
     Executes cmds to remote server using SSH
     
-    The script is first copied using SCP in order to overflood the channel with large scripts
-    Then the script is executed using the defined backend.script_executable
+    The script is streamed through the stdin of a single exec channel and executed using
+    the defined backend.script_executable, saving the SCP upload and extra round-trips.
+    Backends with script_stdin = False have their script first copied using SCP
+    and then executed from the remote file.
     """
     script = '\n'.join(cmds)
     script = script.replace('\r', '')
@@ -33,78 +95,71 @@ def SSH(backend, log, server, cmds, async=False):
     digest = hashlib.md5(bscript).hexdigest()
     path = os.path.join(settings.ORCHESTRATION_TEMP_SCRIPT_DIR, digest)
     remote_path = "%s.remote" % path
-    log.script = '# %s\n%s' % (remote_path, script)
+    if backend.script_stdin:
+        log.script = '# <stdin> %s\n%s' % (digest, script)
+    else:
+        log.script = '# %s\n%s' % (remote_path, script)
     log.save(update_fields=['script'])
     if not cmds:
         return
     channel = None
-    ssh = None
+    connection = None
+    sink = None
+    addr = server.get_address()
     try:
-        # Avoid "Argument list too long" on large scripts by genereting a file
-        # and scping it to the remote server
-        with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600), 'wb') as handle:
-            handle.write(bscript)
+        if not backend.script_stdin:
+            # Avoid "Argument list too long" on large scripts by genereting a file
+            # and scping it to the remote server
+            with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600), 'wb') as handle:
+                handle.write(bscript)
         
-        # ssh connection
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        addr = server.get_address()
-        key = settings.ORCHESTRATION_SSH_KEY_PATH
+        # ssh connection, reusing the pooled transport of this server
         try:
-            ssh.connect(addr, username='root', key_filename=key, timeout=10)
+            connection = pool.acquire(addr)
         except socket.error as e:
             logger.error('%s timed out on %s' % (backend, addr))
             log.state = log.TIMEOUT
             log.stderr = str(e)
             log.save(update_fields=['state', 'stderr'])
             return
-        transport = ssh.get_transport()
-        
-        # Copy script to remote server
-        sftp = paramiko.SFTPClient.from_transport(transport)
-        sftp.put(path, remote_path)
-        sftp.chmod(remote_path, 0o600)
-        sftp.close()
-        os.remove(path)
+        transport = connection.transport
         
-        # Execute it
-        context = {
-            'executable': backend.script_executable,
-            'remote_path': remote_path,
-            'digest': digest,
-            'remove': '' if djsettings.DEBUG else "rm -fr %(remote_path)s\n",
-        }
-        cmd = (
-            "[[ $(md5sum %(remote_path)s|awk {'print $1'}) == %(digest)s ]] && %(executable)s %(remote_path)s\n"
-            "RETURN_CODE=$?\n"
-            "%(remove)s"
-            "exit $RETURN_CODE" % context
-        )
-        channel = transport.open_session()
-        channel.exec_command(cmd)
+        if backend.script_stdin:
+            # Send the script along with the command, single round-trip
+            channel = transport.open_session()
+            channel.exec_command(get_stdin_cmd(backend, bscript, digest))
+            channel.sendall(bscript)
+            channel.shutdown_write()
+        else:
+            # Copy script to remote server
+            sftp = paramiko.SFTPClient.from_transport(transport)
+            sftp.put(path, remote_path)
+            sftp.chmod(remote_path, 0o600)
+            sftp.close()
+            os.remove(path)
+            
+            # Execute it
+            channel = transport.open_session()
+            channel.exec_command(get_file_cmd(backend, remote_path, digest))
         
         # Log results
         logger.debug('%s running on %s' % (backend, server))
         if async:
-            second = False
-            while True:
+            # Output is buffered and periodically flushed to the database
+            sink = LogSink(log)
+            while not channel.exit_status_ready():
                 # Non-blocking is the secret ingridient in the async sauce
-                select.select([channel], [], [])
-                if channel.recv_ready():
-                    part = channel.recv(1024).decode('utf-8')
-                    while part:
-                        log.stdout += part
-                        part = channel.recv(1024).decode('utf-8')
-                if channel.recv_stderr_ready():
-                    part = channel.recv_stderr(1024).decode('utf-8')
-                    while part:
-                        log.stderr += part
-                        part = channel.recv_stderr(1024).decode('utf-8')
-                log.save(update_fields=['stdout', 'stderr'])
-                if channel.exit_status_ready():
-                    if second:
-                        break
-                    second = True
+                select.select([channel], [], [], 1)
+                # Output of quiet executions is flushed on poll timeouts
+                sink.poll()
+                while channel.recv_ready():
+                    sink.write('stdout', channel.recv(65536))
+                while channel.recv_stderr_ready():
+                    sink.write('stderr', channel.recv_stderr(65536))
+            # Remaining output until EOF
+            sink.write('stdout', channel.makefile('rb', -1).read())
+            sink.write('stderr', channel.makefile_stderr('rb', -1).read())
+            sink.close()
         else:
             log.stdout += channel.makefile('rb', -1).read().decode('utf-8')
             log.stderr += channel.makefile_stderr('rb', -1).read().decode('utf-8')
@@ -116,6 +171,8 @@ def SSH(backend, log, server, cmds, async=False):
     except:
         log.state = log.ERROR
         log.traceback = ExceptionInfo(sys.exc_info()).traceback
+        if sink is not None:
+            sink.close()
         logger.error('Exception while executing %s on %s' % (backend, server))
         logger.debug(log.traceback)
         log.save()
@@ -125,8 +182,87 @@ def SSH(backend, log, server, cmds, async=False):
             log.save(update_fields=['state'])
         if channel is not None:
             channel.close()
-        if ssh is not None:
-            ssh.close()
+        if connection is not None:
+            pool.release(connection)
+
+
+def Agent(backend, log, server, cmds, async=False):
+    """
+    Executes cmds on the long-lived agent of the remote server
+    
+    The agent is started on a channel of the pooled SSH transport, its source is streamed
+    through stdin, and kept running for the following executions until the transport gets closed.
+    Scripts run with the same Python interpreter as the agent are executed in-process, keeping
+    imported modules and agent_state warm between runs, output is streamed back as it is produced.
+    ORCHESTRATION_AGENT_SOCKET makes use of a local agent instead, for testing.
+    """
+    script = '\n'.join(cmds)
+    script = script.replace('\r', '')
+    digest = hashlib.md5(script.encode('utf-8')).hexdigest()
+    log.script = '# <agent> %s\n%s' % (digest, script)
+    log.save(update_fields=['script'])
+    if not cmds:
+        return
+    connection = None
+    client = None
+    # Flushed by its own timer while blocked waiting for the agent output
+    sink = LogSink(log, timer=True) if async else None
+    addr = server.get_address()
+    
+    def write(stream, data):
+        if sink is not None:
+            sink.write(stream, data)
+        else:
+            setattr(log, stream, getattr(log, stream) + data)
+    
+    try:
+        try:
+            if settings.ORCHESTRATION_AGENT_SOCKET:
+                client = agent.AgentClient.connect(settings.ORCHESTRATION_AGENT_SOCKET % {
+                    'address': addr,
+                })
+            else:
+                # Idle agents are reused, dead ones are discarded and a new one started
+                connection, client = pool.acquire_agent(addr)
+                if client is None:
+                    client = start_agent(connection)
+        except socket.error as e:
+            logger.error('%s timed out on %s' % (backend, addr))
+            log.state = log.TIMEOUT
+            log.stderr = str(e)
+            log.save(update_fields=['state', 'stderr'])
+            return
+        logger.debug('%s running on %s agent' % (backend, server))
+        exit_code = client.run(backend.script_executable, script, key=backend.get_name(), write=write)
+        if sink is not None:
+            sink.close()
+        if connection is not None:
+            # Kept for the next execution, holding its channel slot
+            pool.release(connection, agent=client)
+            connection = client = None
+        log.exit_code = exit_code
+        log.state = log.SUCCESS if exit_code == 0 else log.FAILURE
+        logger.debug('%s execution state on %s is %s' % (backend, server, log.state))
+        log.save()
+    except:
+        log.state = log.ERROR
+        log.traceback = ExceptionInfo(sys.exc_info()).traceback
+        if sink is not None:
+            sink.close()
+        logger.error('Exception while executing %s on %s agent' % (backend, server))
+        logger.debug(log.traceback)
+        log.save()
+    finally:
+        if log.state == log.STARTED:
+            log.state = log.ABORTED
+            log.save(update_fields=['state'])
+        if sink is not None:
+            # Stops its timer on early returns
+            sink.closed.set()
+        if client is not None:
+            client.close()
+        if connection is not None:
+            pool.release(connection)
 
 
 def Python(backend, log, server, cmds, async=False):
@@ -135,14 +271,16 @@ def Python(backend, log, server, cmds, async=False):
     script = json.dumps(script, indent=4).replace('"', '')
     log.script = '\n'.join([log.script, script])
     log.save(update_fields=['script'])
+    sink = LogSink(log) if async else None
     try:
         for cmd in cmds:
             with CaptureStdout() as stdout:
                 result = cmd(server)
             for line in stdout:
-                log.stdout += line + '\n'
-            if async:
-                log.save(update_fields=['stdout'])
+                if sink:
+                    sink.write('stdout', line + '\n')
+                else:
+                    log.stdout += line + '\n'
     except:
         log.exit_code = 1
         log.state = log.FAILURE
@@ -152,4 +290,6 @@ def Python(backend, log, server, cmds, async=False):
         log.exit_code = 0
         log.state = log.SUCCESS
         logger.debug('%s execution state on %s is %s' % (backend, server, log.state))
+    if sink:
+        sink.close()
     log.save()
@@ -8,7 +8,7 @@ from django.http.response import HttpResponseServerError
 
 from orchestra.utils.python import OrderedSet
 
-from . import manager, Operation
+from . import manager, settings, Operation
 from .helpers import message_user
 from .models import BackendLog
 
@@ -104,7 +104,11 @@ class OperationsMiddleware(object):
                 # We commit transaction just before executing operations
                 # because here is when IntegrityError show up
                 self.leave_transaction_management()
-                logs = manager.execute(scripts, block=block)
+                if settings.ORCHESTRATION_QUEUE_EXECUTION:
+                    # Return the response right away, celery workers will execute them
+                    logs = manager.enqueue(scripts, block=block)
+                else:
+                    logs = manager.execute(scripts, block=block)
                 if logs and resolve(request.path).app_name == 'admin':
                     message_user(request, logs)
                 return response
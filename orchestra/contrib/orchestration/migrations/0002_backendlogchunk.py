@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('orchestration', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='BackendLogChunk',
+            fields=[
+                ('id', models.AutoField(serialize=False, auto_created=True, verbose_name='ID', primary_key=True)),
+                ('stream', models.CharField(choices=[('stdout', 'stdout'), ('stderr', 'stderr')], max_length=16, verbose_name='stream')),
+                ('content', models.TextField(verbose_name='content')),
+                ('log', models.ForeignKey(related_name='chunks', to='orchestration.BackendLog')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.utils.timezone
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('orchestration', '0002_backendlogchunk'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='modified'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='server',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='modified'),
+            preserve_default=False,
+        ),
+    ]
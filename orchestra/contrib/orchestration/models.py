@@ -1,8 +1,14 @@
 import socket
+import time
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Concat
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.module_loading import autodiscover_modules
 from django.utils.translation import ugettext_lazy as _
@@ -24,6 +30,8 @@ class Server(models.Model):
     os = models.CharField(_("operative system"), max_length=32,
         choices=settings.ORCHESTRATION_OS_CHOICES,
         default=settings.ORCHESTRATION_DEFAULT_OS)
+    # Version stamp of the compiled routes, see Route.get_routes_version()
+    modified_at = models.DateTimeField(_("modified"), auto_now=True)
     
     def __str__(self):
         return self.name
@@ -94,6 +102,42 @@ class BackendLog(models.Model):
     
     def backend_class(self):
         return ServiceBackend.get_backend(self.backend)
+    
+    def get_output(self, stream):
+        """ stream output, including the spooled chunks of running executions """
+        output = getattr(self, stream)
+        if self.state in (self.RECEIVED, self.STARTED):
+            chunks = self.chunks.filter(stream=stream).values_list('content', flat=True)
+            output += ''.join(chunks)
+        return output
+    
+    def append_output(self, **streams):
+        """ Appends to the stored streams without rewriting them, i.e. append_output(stdout='...') """
+        updates = {
+            stream: Concat(F(stream), Value(data, output_field=models.TextField()))
+                for stream, data in streams.items() if data
+        }
+        if updates:
+            updates['updated_at'] = timezone.now()
+            BackendLog.objects.filter(pk=self.pk).update(**updates)
+
+
+class BackendLogChunk(models.Model):
+    """ Append-only output spool of running executions with large outputs """
+    STDOUT = 'stdout'
+    STDERR = 'stderr'
+    
+    STREAMS = (
+        (STDOUT, "stdout"),
+        (STDERR, "stderr"),
+    )
+    
+    log = models.ForeignKey(BackendLog, related_name='chunks')
+    stream = models.CharField(_("stream"), max_length=16, choices=STREAMS)
+    content = models.TextField(_("content"))
+    
+    class Meta:
+        ordering = ('id',)
 
 
 class BackendOperation(models.Model):
@@ -123,10 +167,37 @@ class BackendOperation(models.Model):
 autodiscover_modules('backends')
 
 
+class CompiledRoute(object):
+    """ Route with its match expression compiled once """
+    def __init__(self, route):
+        self.route = route
+        self.host = route.host
+        match = str(route.match or 'True').strip()
+        if match == 'True':
+            # Most routes match everything, skip eval() altogether
+            self.code = None
+        else:
+            try:
+                self.code = compile(match, str(route), 'eval')
+            except SyntaxError:
+                # Fail on matches() like non-compiled routes do
+                self.code = match
+    
+    def __str__(self):
+        return str(self.route)
+    
+    def matches(self, instance):
+        if self.code is None:
+            return True
+        return eval(self.code, self.route.get_match_locals(instance))
+
+
 class Route(models.Model):
     """
     Defines the routing that determine in which server a backend is executed
     """
+    _compiled_routes = None
+    
     backend = models.CharField(_("backend"), max_length=256,
         choices=ServiceBackend.get_choices())
     host = models.ForeignKey(Server, verbose_name=_("host"))
@@ -137,6 +208,8 @@ class Route(models.Model):
 #    method = models.CharField(_("method"), max_lenght=32, choices=method_choices,
 #            default=MethodBackend.get_default())
     is_active = models.BooleanField(_("active"), default=True)
+    # Version stamp of the compiled routes, see Route.get_routes_version()
+    modified_at = models.DateTimeField(_("modified"), auto_now=True)
     
     class Meta:
         unique_together = ('backend', 'host')
@@ -149,16 +222,53 @@ class Route(models.Model):
         return ServiceBackend.get_backend(self.backend)
     
     @classmethod
-    def get_servers(cls, operation, **kwargs):
-        cache = kwargs.get('cache', {})
-        if not cache:
+    def get_routes_version(cls):
+        """
+        Changes whenever a route or one of its hosts is saved, or a route is deleted.
+        It is stored on the database since the default cache backend is per-process.
+        """
+        stamp = cls.objects.aggregate(Max('modified_at'), Max('host__modified_at'), Count('id'))
+        return (stamp['modified_at__max'], stamp['host__modified_at__max'], stamp['id__count'])
+    
+    @classmethod
+    def get_compiled_routes(cls):
+        """
+        Process-wide index of active routes by (backend, action), with their match
+        expressions already compiled. Changes made by this process reset it right away,
+        changes made by other processes are picked up within ORCHESTRATION_ROUTES_VERSION_TTL
+        seconds, when the routes version is checked again.
+        """
+        now = time.time()
+        registry = cls._compiled_routes
+        if registry is not None and now-registry['checked_at'] < settings.ORCHESTRATION_ROUTES_VERSION_TTL:
+            return registry['routes']
+        version = cls.get_routes_version()
+        if registry is not None and registry['version'] == version:
+            registry['checked_at'] = now
+        else:
+            routes = {}
             for route in cls.objects.filter(is_active=True).select_related('host'):
+                compiled = CompiledRoute(route)
                 for action in route.backend_class.get_actions():
                     key = (route.backend, action)
                     try:
-                        cache[key].append(route)
+                        routes[key].append(compiled)
                     except KeyError:
-                        cache[key] = [route]
+                        routes[key] = [compiled]
+            registry = {
+                'version': version,
+                'checked_at': now,
+                'routes': routes,
+            }
+            cls._compiled_routes = registry
+        return registry['routes']
+    
+    @classmethod
+    def get_servers(cls, operation, **kwargs):
+        cache = kwargs.get('cache', {})
+        if not cache:
+            # Request-level snapshot of the routes
+            cache.update(cls.get_compiled_routes())
         servers = []
         backend_cls = operation.backend
         key = (backend_cls.get_name(), operation.action)
@@ -187,13 +297,16 @@ class Route(models.Model):
                 name = type(exception).__name__
                 raise ValidationError(': '.join((name, exception)))
     
-    def matches(self, instance):
-        safe_locals = {
+    @staticmethod
+    def get_match_locals(instance):
+        return {
             'instance': instance,
             'obj': instance,
             instance._meta.model_name: instance,
         }
-        return eval(self.match, safe_locals)
+    
+    def matches(self, instance):
+        return eval(str(self.match), self.get_match_locals(instance))
     
     def enable(self):
         self.is_active = True
@@ -202,3 +315,12 @@ class Route(models.Model):
     def disable(self):
         self.is_active = False
         self.save()
+
+
+@receiver(post_save, sender=Route, dispatch_uid='orchestration.reset_routes_on_route_save')
+@receiver(post_delete, sender=Route, dispatch_uid='orchestration.reset_routes_on_route_delete')
+@receiver(post_save, sender=Server, dispatch_uid='orchestration.reset_routes_on_server_save')
+@receiver(post_delete, sender=Server, dispatch_uid='orchestration.reset_routes_on_server_delete')
+def reset_compiled_routes(sender, *args, **kwargs):
+    """ Local changes are seen right away, without waiting for the version TTL """
+    Route._compiled_routes = None
@@ -41,3 +41,98 @@ ORCHESTRATION_DISABLE_EXECUTION = Setting('ORCHESTRATION_DISABLE_EXECUTION',
 ORCHESTRATION_BACKEND_CLEANUP_DAYS = Setting('ORCHESTRATION_BACKEND_CLEANUP_DAYS',
     15
 )
+
+
+ORCHESTRATION_SSH_POOL_MAX_CHANNELS = Setting('ORCHESTRATION_SSH_POOL_MAX_CHANNELS',
+    10,
+    help_text="Maximum number of concurrent channels per host, sshd defaults to MaxSessions 10.",
+)
+
+
+ORCHESTRATION_SSH_POOL_KEEPALIVE = Setting('ORCHESTRATION_SSH_POOL_KEEPALIVE',
+    30,
+    help_text="Seconds between SSH keepalive packets of pooled connections, 0 disables them.",
+)
+
+
+ORCHESTRATION_SSH_POOL_IDLE_TIMEOUT = Setting('ORCHESTRATION_SSH_POOL_IDLE_TIMEOUT',
+    300,
+    help_text="Seconds after which an idle pooled SSH connection is closed.",
+)
+
+
+ORCHESTRATION_SSH_POOL_ACQUIRE_TIMEOUT = Setting('ORCHESTRATION_SSH_POOL_ACQUIRE_TIMEOUT',
+    600,
+    help_text="Seconds an execution waits for a free channel of its host before timing out.",
+)
+
+
+ORCHESTRATION_MAX_WORKERS = Setting('ORCHESTRATION_MAX_WORKERS',
+    32,
+    help_text="Maximum number of backends executed concurrently by each process.",
+)
+
+
+ORCHESTRATION_MAX_WORKERS_PER_SERVER = Setting('ORCHESTRATION_MAX_WORKERS_PER_SERVER',
+    4,
+    help_text="Maximum number of backends executed concurrently on the same server.",
+)
+
+
+ORCHESTRATION_TASK_TIMEOUT = Setting('ORCHESTRATION_TASK_TIMEOUT',
+    None,
+    help_text="Seconds to wait for a backend execution, queue time included. None waits forever.",
+)
+
+
+ORCHESTRATION_QUEUE_EXECUTION = Setting('ORCHESTRATION_QUEUE_EXECUTION',
+    False,
+    help_text="Queues backend executions on the celery workers instead of running them "
+              "before returning the HTTP response. Progress is reported by the backend logs state.",
+)
+
+
+ORCHESTRATION_QUEUE_ORDER_TIMEOUT = Setting('ORCHESTRATION_QUEUE_ORDER_TIMEOUT',
+    3600,
+    help_text="Seconds a queued execution waits for previous executions of the same backend "
+              "on the same server before considering them lost.",
+)
+
+
+ORCHESTRATION_LOG_FLUSH_INTERVAL = Setting('ORCHESTRATION_LOG_FLUSH_INTERVAL',
+    1,
+    help_text="Seconds between database writes of the output of running executions.",
+)
+
+
+ORCHESTRATION_LOG_FLUSH_SIZE = Setting('ORCHESTRATION_LOG_FLUSH_SIZE',
+    65536,
+    help_text="Pending output bytes that force a database write of running executions.",
+)
+
+
+ORCHESTRATION_ROUTES_VERSION_TTL = Setting('ORCHESTRATION_ROUTES_VERSION_TTL',
+    5,
+    help_text="Seconds the compiled routes are used before checking if other processes have changed them.",
+)
+
+
+ORCHESTRATION_LOG_SPOOL_THRESHOLD = Setting('ORCHESTRATION_LOG_SPOOL_THRESHOLD',
+    1048576,
+    help_text="Output size from which running executions append their output to separate chunks "
+              "instead of rewriting the whole log. None disables it.",
+)
+
+
+ORCHESTRATION_AGENT_PYTHON = Setting('ORCHESTRATION_AGENT_PYTHON',
+    '/usr/bin/python',
+    help_text="Python interpreter running the agent on the servers, Python scripts of backends "
+              "using methods.Agent and this same script_executable are executed within the agent.",
+)
+
+
+ORCHESTRATION_AGENT_SOCKET = Setting('ORCHESTRATION_AGENT_SOCKET',
+    '',
+    help_text="Unix socket of a locally running agent (<tt>agent.py --socket &lt;path&gt;</tt>) used by "
+              "methods.Agent instead of SSH, for testing. <tt>%(address)s</tt> is replaced by the server address.",
+)
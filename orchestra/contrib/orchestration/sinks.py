@@ -0,0 +1,127 @@
+import codecs
+import threading
+import time
+
+from django import db
+
+from . import settings
+
+
+class LogSink(object):
+    """
+    Buffers the output of a running execution and flushes it to its BackendLog once
+    flush_interval seconds have passed or flush_size bytes are pending. Quiet executions
+    are flushed by calling poll() periodically, or by the sink itself with timer=True.
+    
+    The first flush writes the log stdout and stderr columns, later ones append the pending
+    output to them. Outputs larger than spool_threshold bytes are appended to BackendLogChunk
+    rows instead and the columns are only written once when the sink is closed.
+    """
+    STREAMS = ('stdout', 'stderr')
+    
+    def __init__(self, log, flush_interval=None, flush_size=None, spool_threshold=-1, timer=False):
+        self.log = log
+        if flush_interval is None:
+            flush_interval = settings.ORCHESTRATION_LOG_FLUSH_INTERVAL
+        if flush_size is None:
+            flush_size = settings.ORCHESTRATION_LOG_FLUSH_SIZE
+        if spool_threshold == -1:
+            spool_threshold = settings.ORCHESTRATION_LOG_SPOOL_THRESHOLD
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.spool_threshold = spool_threshold
+        self.spooling = False
+        self.spooled = False
+        self.flushed = False
+        self.lock = threading.RLock()
+        self.closed = threading.Event()
+        self.buffers = {}
+        self.pending = {}
+        self.decoders = {}
+        for stream in self.STREAMS:
+            value = getattr(log, stream)
+            self.buffers[stream] = [value] if value else []
+            self.pending[stream] = []
+            self.decoders[stream] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.size = sum(len(value) for value in (log.stdout, log.stderr))
+        self.pending_size = 0
+        self.last_flush = time.time()
+        if timer:
+            thread = threading.Thread(target=self.run_timer, name='orchestration-log-sink')
+            thread.daemon = True
+            thread.start()
+    
+    def run_timer(self):
+        try:
+            while not self.closed.wait(self.flush_interval):
+                self.poll()
+        finally:
+            # Threads have their own database connection
+            db.connection.close()
+    
+    def write(self, stream, data):
+        """ data can be bytes, multibyte characters split between writes are preserved """
+        with self.lock:
+            if isinstance(data, bytes):
+                data = self.decoders[stream].decode(data)
+            if not data:
+                return
+            self.buffers[stream].append(data)
+            self.pending[stream].append(data)
+            self.size += len(data)
+            self.pending_size += len(data)
+            if self.pending_size >= self.flush_size:
+                self.flush()
+            else:
+                self.poll()
+    
+    def poll(self):
+        """ Flushes the pending output when flush_interval seconds have passed since the last flush """
+        with self.lock:
+            if self.pending_size and time.time()-self.last_flush >= self.flush_interval:
+                self.flush()
+    
+    def getvalue(self, stream):
+        return ''.join(self.buffers[stream])
+    
+    def flush(self):
+        with self.lock:
+            self.last_flush = time.time()
+            if not self.pending_size:
+                return
+            if self.spool_threshold is not None and self.size > self.spool_threshold:
+                # The log columns keep what has already been flushed, chunks go after it
+                self.spooling = True
+            if self.spooling:
+                from .models import BackendLogChunk
+                BackendLogChunk.objects.bulk_create([
+                    BackendLogChunk(log=self.log, stream=stream, content=''.join(self.pending[stream]))
+                        for stream in self.STREAMS if self.pending[stream]
+                ])
+                self.spooled = True
+            elif self.flushed:
+                self.log.append_output(**{
+                    stream: ''.join(self.pending[stream]) for stream in self.STREAMS
+                })
+            else:
+                for stream in self.STREAMS:
+                    setattr(self.log, stream, self.getvalue(stream))
+                self.log.save(update_fields=self.STREAMS)
+                self.flushed = True
+            for stream in self.STREAMS:
+                self.pending[stream] = []
+            self.pending_size = 0
+    
+    def close(self):
+        """
+        Sets the complete output on the log, it is up to the caller to save it.
+        Spooled logs are saved here, right before their chunks are removed.
+        """
+        self.closed.set()
+        with self.lock:
+            for stream in self.STREAMS:
+                self.write(stream, self.decoders[stream].decode(b'', final=True))
+                setattr(self.log, stream, self.getvalue(stream))
+            if self.spooled:
+                self.log.save(update_fields=self.STREAMS)
+                self.log.chunks.all().delete()
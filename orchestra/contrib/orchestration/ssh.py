@@ -0,0 +1,297 @@
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import paramiko
+
+from . import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class SSHConnection(object):
+    """ Authenticated paramiko transport shared by all the channels opened to one host """
+    def __init__(self, addr, client, max_channels):
+        self.addr = addr
+        # paramiko closes the transport when its client gets garbage collected
+        self.client = client
+        self.transport = client.get_transport()
+        self.channels = threading.BoundedSemaphore(max_channels)
+        # Idle clients of the agents running on channels of this transport, each one holding its slot
+        self.agents = []
+        self.active = 0
+        self.created_at = time.time()
+        self.last_used = self.created_at
+    
+    def __str__(self):
+        return self.addr
+    
+    def is_alive(self):
+        """ Health check, sending an ignore packet forces detection of half-closed sockets """
+        if not self.transport.is_active():
+            return False
+        try:
+            self.transport.send_ignore()
+        except (EOFError, socket.error, paramiko.SSHException):
+            return False
+        return True
+    
+    @staticmethod
+    def is_agent_alive(agent):
+        channel = agent.channel
+        return not channel.closed and not channel.exit_status_ready()
+    
+    def is_idle(self, timeout):
+        return not self.active and time.time()-self.last_used > timeout
+    
+    def close(self):
+        try:
+            self.client.close()
+        except Exception as exc:
+            logger.debug('Error closing SSH transport to %s: %s' % (self.addr, exc))
+
+
+class SSHConnectionPool(object):
+    """
+    Process-wide pool of SSH transports keyed by server address
+    
+    A single authenticated transport is kept per host and multiplexed between threads,
+    each execution opening its own channel on it. Transports are kept alive with SSH
+    keepalives, checked for health before being handed out and evicted after being idle
+    for ORCHESTRATION_SSH_POOL_IDLE_TIMEOUT seconds.
+    The number of concurrent channels per host is limited by ORCHESTRATION_SSH_POOL_MAX_CHANNELS,
+    sshd defaults to MaxSessions 10, waiting for a free channel times out after
+    ORCHESTRATION_SSH_POOL_ACQUIRE_TIMEOUT seconds.
+    """
+    def __init__(self, max_channels=None, keepalive=None, idle_timeout=None, connect_timeout=10,
+            acquire_timeout=None):
+        self.max_channels = max_channels or settings.ORCHESTRATION_SSH_POOL_MAX_CHANNELS
+        self.keepalive = keepalive if keepalive is not None else settings.ORCHESTRATION_SSH_POOL_KEEPALIVE
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.ORCHESTRATION_SSH_POOL_IDLE_TIMEOUT
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout or settings.ORCHESTRATION_SSH_POOL_ACQUIRE_TIMEOUT
+        self.lock = threading.RLock()
+        self.reset()
+    
+    def reset(self):
+        """ Forget all connections, used when the process has been forked """
+        self.pid = os.getpid()
+        self.connections = {}
+        self.host_locks = {}
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'errors': 0,
+            'agent_hits': 0,
+            'connect_time': 0.0,
+            'wait_time': 0.0,
+        }
+    
+    def incr(self, stat, value=1):
+        with self.lock:
+            self.stats[stat] += value
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['connections'] = len(self.connections)
+        requests = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = float(stats['hits'])/requests if requests else 0.0
+        stats['avg_connect_time'] = stats['connect_time']/stats['misses'] if stats['misses'] else 0.0
+        stats['avg_wait_time'] = stats['wait_time']/requests if requests else 0.0
+        return stats
+    
+    def connect(self, addr):
+        """ Opens a new authenticated transport to addr """
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        key = settings.ORCHESTRATION_SSH_KEY_PATH
+        start = time.time()
+        ssh.connect(addr, username='root', key_filename=key, timeout=self.connect_timeout)
+        if self.keepalive:
+            ssh.get_transport().set_keepalive(self.keepalive)
+        self.incr('connect_time', time.time()-start)
+        return SSHConnection(addr, ssh, self.max_channels)
+    
+    def get_host_lock(self, addr):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Transports can not be shared between processes (celery prefork workers)
+                self.reset()
+            try:
+                return self.host_locks[addr]
+            except KeyError:
+                lock = self.host_locks[addr] = threading.Lock()
+                return lock
+    
+    def get_connection(self, addr):
+        """ Returns a healthy connection to addr, connecting if needed """
+        self.evict_idle()
+        # Per host lock, avoids concurrent handshakes against the same server
+        with self.get_host_lock(addr):
+            connection = self.connections.get(addr)
+            if connection is not None:
+                if connection.is_alive():
+                    self.incr('hits')
+                    return connection
+                logger.debug('Discarding broken SSH transport to %s' % addr)
+                self.discard(connection)
+            self.incr('misses')
+            try:
+                connection = self.connect(addr)
+            except:
+                self.incr('errors')
+                raise
+            with self.lock:
+                self.connections[addr] = connection
+            return connection
+    
+    def discard(self, connection):
+        with self.lock:
+            if self.connections.get(connection.addr) is connection:
+                self.connections.pop(connection.addr)
+        connection.close()
+    
+    def evict_idle(self):
+        with self.lock:
+            idle = [
+                connection for connection in self.connections.values()
+                    if connection.is_idle(self.idle_timeout)
+            ]
+            for connection in idle:
+                self.connections.pop(connection.addr)
+                self.stats['evictions'] += 1
+        for connection in idle:
+            logger.debug('Evicting idle SSH transport to %s' % connection)
+            connection.close()
+    
+    def pop_agent(self, connection):
+        """ Returns an idle agent of connection, its channel slot is handed over along with it """
+        with self.lock:
+            return connection.agents.pop() if connection.agents else None
+    
+    def close_agent(self, connection, agent):
+        """ Closes an agent that is holding a channel slot, freeing its slot """
+        agent.close()
+        connection.channels.release()
+    
+    def acquire_channel(self, connection):
+        """
+        Takes a channel slot of connection, closing idle agents when they are holding all of them
+        raises socket.timeout when no slot gets free within acquire_timeout seconds
+        """
+        deadline = time.time() + self.acquire_timeout
+        while not connection.channels.acquire(False):
+            agent = self.pop_agent(connection)
+            if agent is not None:
+                self.close_agent(connection, agent)
+                continue
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.incr('errors')
+                raise socket.timeout("No free channel on %s after %s seconds." % (
+                    connection.addr, self.acquire_timeout))
+            # Busy agents may become idle while waiting, keeping their slot
+            if connection.channels.acquire(timeout=min(remaining, 1)):
+                return
+    
+    def acquire(self, addr):
+        """ Returns a pooled connection to addr holding one of its channel slots """
+        return self.acquire_slot(self.get_connection(addr))
+    
+    def acquire_slot(self, connection):
+        """ Returns connection once one of its channel slots is held """
+        start = time.time()
+        self.acquire_channel(connection)
+        self.incr('wait_time', time.time()-start)
+        with self.lock:
+            connection.active += 1
+        return connection
+    
+    def acquire_agent(self, addr):
+        """
+        Returns (connection, agent) with a live idle agent of addr, which already holds a
+        channel slot, or (connection, None) holding a new channel slot for starting one
+        """
+        connection = self.get_connection(addr)
+        while True:
+            agent = self.pop_agent(connection)
+            if agent is None:
+                return self.acquire_slot(connection), None
+            if connection.is_agent_alive(agent):
+                break
+            logger.debug('Discarding dead agent on %s' % addr)
+            self.close_agent(connection, agent)
+        self.incr('agent_hits')
+        with self.lock:
+            connection.active += 1
+        return connection, agent
+    
+    def release(self, connection, agent=None):
+        """
+        Channels opened on the connection should be closed before releasing it,
+        except the channel of agent, which is kept idle holding its slot
+        """
+        with self.lock:
+            connection.active -= 1
+            connection.last_used = time.time()
+            if agent is not None:
+                connection.agents.append(agent)
+        if agent is None:
+            connection.channels.release()
+        if not connection.transport.is_active():
+            self.discard(connection)
+    
+    @contextmanager
+    def transport(self, addr):
+        connection = self.acquire(addr)
+        try:
+            yield connection.transport
+        finally:
+            self.release(connection)
+    
+    def close(self, addr=None):
+        """ Closes all connections or the connection to addr """
+        with self.lock:
+            if addr is None:
+                connections = list(self.connections.values())
+                self.connections = {}
+            else:
+                connections = [self.connections.pop(addr)] if addr in self.connections else []
+        for connection in connections:
+            connection.close()
+    
+    def run(self, addr, cmd, stdin=b''):
+        """ Executes cmd on addr, returning (stdout, stderr, exit_code) """
+        with self.transport(addr) as transport:
+            channel = transport.open_session()
+            try:
+                channel.exec_command(cmd)
+                if stdin:
+                    channel.sendall(stdin)
+                channel.shutdown_write()
+                # Both streams are drained together, a full stderr window would block the command
+                stdout, stderr = [], []
+                while not channel.exit_status_ready():
+                    select.select([channel], [], [], 1)
+                    while channel.recv_ready():
+                        stdout.append(channel.recv(65536))
+                    while channel.recv_stderr_ready():
+                        stderr.append(channel.recv_stderr(65536))
+                # Remaining output until EOF
+                stdout.append(channel.makefile('rb', -1).read())
+                stderr.append(channel.makefile_stderr('rb', -1).read())
+                stdout, stderr = b''.join(stdout), b''.join(stderr)
+                exit_code = channel.recv_exit_status()
+            finally:
+                channel.close()
+        return stdout, stderr, exit_code
+
+
+pool = SSHConnectionPool()
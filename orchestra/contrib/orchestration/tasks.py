@@ -1,12 +1,44 @@
 from datetime import timedelta
 
+from celery import shared_task
 from celery.task.schedules import crontab
 from celery.decorators import periodic_task
 from django.utils import timezone
 
+from . import settings
 from .models import BackendLog
 
 
+@shared_task(name='orchestration.ExecuteLog', bind=True, max_retries=None)
+def execute_log(self, log_id):
+    """ Executes a script previously queued by manager.enqueue() """
+    from . import manager
+    try:
+        log = BackendLog.objects.select_related('server').get(pk=log_id)
+    except BackendLog.DoesNotExist:
+        # The enqueuing transaction may not be commited yet
+        if self.request.retries >= 10:
+            raise
+        raise self.retry(countdown=1)
+    if log.state != BackendLog.RECEIVED:
+        return log.state
+    # Preserve the execution order of the same backend on the same server
+    epoch = timezone.now()-timedelta(seconds=settings.ORCHESTRATION_QUEUE_ORDER_TIMEOUT)
+    previous = BackendLog.objects.filter(server_id=log.server_id, backend=log.backend, id__lt=log.id,
+        state__in=(BackendLog.RECEIVED, BackendLog.STARTED), updated_at__gt=epoch)
+    if previous.exists():
+        raise self.retry(countdown=1)
+    # Only one worker gets to execute it
+    if not BackendLog.objects.filter(pk=log.pk, state=BackendLog.RECEIVED).update(state=BackendLog.STARTED):
+        return
+    log.state = BackendLog.STARTED
+    backend = log.backend_class()
+    backend.content = [(backend.script_method, [log.script])]
+    execute = manager.as_task(backend.execute)
+    log = execute(log.server, async=True, log=log)
+    return log.state if log else BackendLog.EXCEPTION
+
+
 @periodic_task(run_every=crontab(hour=7, minute=30, day_of_week=1))
 def backend_logs_cleanup():
     days = settings.ORCHESTRATION_BACKEND_CLEANUP_DAYS
@@ -0,0 +1,74 @@
+"""
+Benchmarks, not collected by the test runner
+    
+    python manage.py test orchestra.contrib.orchestration.tests.benchmarks
+"""
+import copy
+import sys
+import timeit
+
+from orchestra.contrib.systemusers.backends import UNIXUserBackend
+from orchestra.utils.python import OrderedSet
+from orchestra.utils.tests import BaseTestCase
+
+from .. import manager, Operation
+from ..models import BackendLog, Route, Server
+
+
+class OperationSnapshotBenchmark(BaseTestCase):
+    LOGS = 500
+    REPEAT = 200
+    
+    def setUp(self):
+        self.server = Server.objects.create(name='web.example.com')
+        BackendLog.objects.bulk_create([
+            BackendLog(backend='Apache2Backend', server=self.server, stdout='x'*512)
+                for i in range(self.LOGS)
+        ])
+        self.server = Server.objects.prefetch_related('execution_logs').get(pk=self.server.pk)
+        self.server.description_cache = 'dynamic attribute'
+    
+    def test_collection_cost(self):
+        deepcopy = timeit.timeit(lambda: copy.deepcopy(self.server), number=self.REPEAT)
+        snapshot = timeit.timeit(lambda: Operation.snapshot(self.server), number=self.REPEAT)
+        sys.stderr.write(
+            "\n%i operations over an instance with %i prefetched objects: "
+            "deepcopy %.4fs, snapshot %.4fs (x%.0f)\n" % (
+                self.REPEAT, self.LOGS, deepcopy, snapshot, deepcopy/snapshot)
+        )
+        copied = Operation.snapshot(self.server)
+        self.assertEqual(self.server.pk, copied.pk)
+        self.assertEqual('dynamic attribute', copied.description_cache)
+        self.assertEqual(self.LOGS, len(copied.execution_logs.all()))
+        self.assertLess(snapshot, deepcopy)
+
+
+class CollectionBenchmark(BaseTestCase):
+    """ Whole collection pass, routing included, as run by the post_save signal """
+    REPEAT = 500
+    
+    def setUp(self):
+        server = Server.objects.create(name='web.example.com')
+        Route.objects.create(backend=UNIXUserBackend.get_name(), host=server)
+        self.user = self.create_account().systemusers.get()
+    
+    def collect(self):
+        operations = OrderedSet()
+        route_cache = {}
+        manager.collect(self.user, Operation.SAVE, operations=operations, route_cache=route_cache)
+        return operations
+    
+    def test_collect(self):
+        operations = self.collect()
+        self.assertIn(Operation(UNIXUserBackend, self.user, Operation.SAVE), operations)
+        snapshot = timeit.timeit(self.collect, number=self.REPEAT)
+        original = Operation.snapshot
+        Operation.snapshot = staticmethod(copy.deepcopy)
+        try:
+            deepcopy = timeit.timeit(self.collect, number=self.REPEAT)
+        finally:
+            Operation.snapshot = original
+        sys.stderr.write(
+            "\n%i collections of %i operations: deepcopy %.4fs, snapshot %.4fs (x%.1f)\n" % (
+                self.REPEAT, len(operations), deepcopy, snapshot, deepcopy/snapshot)
+        )
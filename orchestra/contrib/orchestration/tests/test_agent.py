@@ -0,0 +1,52 @@
+import socket
+import sys
+import threading
+
+from django.test import SimpleTestCase
+
+from ..agent import Agent, AgentClient, AgentError
+
+
+class AgentTests(SimpleTestCase):
+    def setUp(self):
+        server, client = socket.socketpair()
+        self.agent = Agent()
+        thread = threading.Thread(target=self.agent.serve,
+            args=(server.makefile('rb'), server.makefile('wb')))
+        thread.daemon = True
+        thread.start()
+        self.client = AgentClient(client.makefile('rb'), client.makefile('wb'), channel=client)
+        self.output = []
+    
+    def tearDown(self):
+        self.client.close()
+    
+    def write(self, stream, data):
+        self.output.append((stream, data))
+    
+    def test_process(self):
+        exit_code = self.client.run('/bin/bash', 'echo hello\necho error >&2\nexit 3', write=self.write)
+        self.assertEqual(3, exit_code)
+        # Frames of different streams are sent as they are read, in no particular order
+        for stream, content in (('stdout', 'hello\n'), ('stderr', 'error\n')):
+            self.assertEqual(content, ''.join(data for name, data in self.output if name == stream))
+    
+    def test_python_state(self):
+        script = (
+            "agent_state['runs'] = agent_state.get('runs', 0) + 1\n"
+            "print(agent_state['runs'])"
+        )
+        self.assertEqual(0, self.client.run(sys.executable, script, key='Backend', write=self.write))
+        self.assertEqual(0, self.client.run(sys.executable, script, key='Backend', write=self.write))
+        self.assertEqual([('stdout', '1\n'), ('stdout', '2\n')], self.output)
+        self.assertEqual(2, self.client.ping()['runs'])
+    
+    def test_python_exit(self):
+        self.assertEqual(2, self.client.run(sys.executable, 'import sys\nsys.exit(2)'))
+        self.assertEqual(1, self.client.run(sys.executable, 'raise ValueError', write=self.write))
+        self.assertIn('ValueError', self.output[0][1])
+    
+    def test_unknown_method(self):
+        with self.assertRaises(AgentError):
+            list(self.client.request('unknown'))
+        self.assertEqual('pong', self.client.ping()['result'])
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from ..executor import BackendExecutor
+
+
+class BackendExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = BackendExecutor(max_workers=4, max_per_server=2, idle_timeout=1)
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+    
+    def execute(self, server):
+        with self.lock:
+            self.running[server] = self.running.get(server, 0) + 1
+            self.max_running[server] = max(self.max_running.get(server, 0), self.running[server])
+        time.sleep(0.05)
+        with self.lock:
+            self.running[server] -= 1
+    
+    def test_per_server_limit(self):
+        tasks = [self.executor.submit('web', self.execute, 'web') for i in range(6)]
+        tasks.append(self.executor.submit('mail', self.execute, 'mail'))
+        for task in tasks:
+            self.assertTrue(task.join())
+        self.assertEqual(2, self.max_running['web'])
+        stats = self.executor.get_stats()
+        self.assertEqual(7, stats['completed'])
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertLessEqual(stats['workers'], 4)
+    
+    def test_timeout(self):
+        task = self.executor.submit('web', time.sleep, 0.5, timeout=0.1)
+        self.assertFalse(task.join())
+    
+    def test_burst_parallelism(self):
+        executor = BackendExecutor(max_workers=8, max_per_server=2, idle_timeout=5)
+        # One warm idle worker
+        executor.submit('web', time.sleep, 0).join()
+        time.sleep(0.05)
+        start = time.time()
+        tasks = [executor.submit('web%i' % num, time.sleep, 0.3) for num in range(8)]
+        for task in tasks:
+            self.assertTrue(task.join())
+        # Serialized on a single worker it would take 2.4s
+        self.assertLess(time.time()-start, 0.9)
+    
+    def test_abandon(self):
+        task = self.executor.submit('web', time.sleep, 0.3, timeout=0.05)
+        self.assertFalse(task.join())
+        self.assertFalse(self.executor.cancel(task))
+        self.assertTrue(task.abandoned)
+        self.assertEqual(1, self.executor.get_stats()['abandoned'])
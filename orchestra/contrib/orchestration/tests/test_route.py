@@ -1,6 +1,8 @@
+from django.utils import timezone
+
 from orchestra.utils.tests import BaseTestCase
 
-from .. import backends, Operation
+from .. import backends, settings, Operation
 from ..models import Route, Server
 
 
@@ -39,3 +41,42 @@ class RouterTests(BaseTestCase):
         route = Route.objects.create(backend=backend, host=self.host2,
                 match='route.backend == "something else"')
         self.assertEqual(2, len(Route.get_servers(operation)))
+    
+    def test_compiled_routes(self):
+        
+        class CompiledTestBackend(backends.ServiceController):
+            verbose_name = 'Compiled route'
+            model = 'orchestration.Route'
+            
+            def save(self, instance):
+                pass
+        
+        choices = backends.ServiceBackend.get_choices()
+        Route._meta.get_field_by_name('backend')[0]._choices = choices
+        backend = CompiledTestBackend.get_name()
+        
+        route = Route.objects.create(backend=backend, host=self.host, match='True')
+        operation = Operation(backend=CompiledTestBackend, instance=route, action='save')
+        routes = Route.get_compiled_routes()
+        self.assertIsNone(routes[(backend, 'save')][0].code)
+        self.assertIs(routes, Route.get_compiled_routes())
+        
+        route.match = 'route.backend == "something else"'
+        route.save()
+        routes = Route.get_compiled_routes()
+        self.assertIsNotNone(routes[(backend, 'save')][0].code)
+        self.assertEqual(0, len(Route.get_servers(operation)))
+        
+        # Within the TTL the routes version is not checked
+        with self.assertNumQueries(0):
+            self.assertIs(routes, Route.get_compiled_routes())
+        # Saves from other processes are not signaled to this one
+        Route.objects.filter(pk=route.pk).update(match='True', modified_at=timezone.now())
+        self.assertIs(routes, Route.get_compiled_routes())
+        ttl = settings.ORCHESTRATION_ROUTES_VERSION_TTL
+        settings.ORCHESTRATION_ROUTES_VERSION_TTL = 0
+        try:
+            routes = Route.get_compiled_routes()
+        finally:
+            settings.ORCHESTRATION_ROUTES_VERSION_TTL = ttl
+        self.assertEqual(1, len(Route.get_servers(operation)))
@@ -0,0 +1,73 @@
+import time
+
+from django.test import SimpleTestCase
+
+from ..sinks import LogSink
+
+
+class FakeLog(object):
+    def __init__(self):
+        self.stdout = ''
+        self.stderr = ''
+        self.saves = 0
+        self.appends = []
+    
+    def save(self, update_fields=None):
+        self.saves += 1
+    
+    def append_output(self, **streams):
+        self.appends.append(streams)
+
+
+class LogSinkTests(SimpleTestCase):
+    def test_buffered_flush(self):
+        log = FakeLog()
+        sink = LogSink(log, flush_interval=3600, flush_size=10, spool_threshold=None)
+        sink.write('stdout', b'hello')
+        self.assertEqual(0, log.saves)
+        sink.write('stdout', b' world')
+        self.assertEqual(1, log.saves)
+        self.assertEqual('hello world', log.stdout)
+        sink.write('stderr', 'oops')
+        sink.close()
+        self.assertEqual('oops', log.stderr)
+        self.assertEqual(1, log.saves)
+    
+    def test_split_multibyte(self):
+        log = FakeLog()
+        sink = LogSink(log, flush_interval=3600, flush_size=1024, spool_threshold=None)
+        data = 'àèò'.encode('utf-8')
+        sink.write('stdout', data[:1])
+        sink.write('stdout', data[1:])
+        sink.close()
+        self.assertEqual('àèò', log.stdout)
+    
+    def test_append(self):
+        log = FakeLog()
+        sink = LogSink(log, flush_interval=3600, flush_size=1, spool_threshold=None)
+        sink.write('stdout', 'hello')
+        sink.write('stdout', ' world')
+        # Only the first flush rewrites the columns
+        self.assertEqual(1, log.saves)
+        self.assertEqual('hello', log.stdout)
+        self.assertEqual([{'stdout': ' world', 'stderr': ''}], log.appends)
+    
+    def test_poll(self):
+        log = FakeLog()
+        sink = LogSink(log, flush_interval=0.05, flush_size=1024, spool_threshold=None)
+        sink.write('stdout', 'hello')
+        sink.poll()
+        self.assertEqual(0, log.saves)
+        time.sleep(0.05)
+        sink.poll()
+        self.assertEqual(1, log.saves)
+        self.assertEqual('hello', log.stdout)
+    
+    def test_timer(self):
+        log = FakeLog()
+        sink = LogSink(log, flush_interval=0.05, flush_size=1024, spool_threshold=None, timer=True)
+        sink.write('stdout', 'hello')
+        # Flushed without further writes
+        time.sleep(0.2)
+        self.assertEqual(1, log.saves)
+        sink.close()
@@ -0,0 +1,141 @@
+import socket
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from ..ssh import SSHConnection, SSHConnectionPool
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = True
+    
+    def is_active(self):
+        return self.active
+    
+    def send_ignore(self):
+        pass
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.transport = FakeTransport()
+    
+    def get_transport(self):
+        return self.transport
+    
+    def close(self):
+        self.transport.active = False
+
+
+class FakeChannel(object):
+    def __init__(self):
+        self.closed = False
+        self.exited = False
+    
+    def exit_status_ready(self):
+        return self.exited
+
+
+class FakeAgent(object):
+    def __init__(self):
+        self.channel = FakeChannel()
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+
+
+class FakePool(SSHConnectionPool):
+    def connect(self, addr):
+        return SSHConnection(addr, FakeClient(), self.max_channels)
+
+
+class SSHConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = FakePool(max_channels=2, keepalive=0, idle_timeout=60)
+    
+    def test_reuse(self):
+        connection = self.pool.acquire('web.example.com')
+        self.pool.release(connection)
+        self.assertIs(connection, self.pool.acquire('web.example.com'))
+        stats = self.pool.get_stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['connections'])
+    
+    def test_backends_share_transport(self):
+        """ concurrent backends of one server run on their own channel of a single transport """
+        transports = []
+        
+        def execute():
+            connection = self.pool.acquire('web.example.com')
+            try:
+                transports.append(connection.transport)
+                time.sleep(0.05)
+            finally:
+                self.pool.release(connection)
+        
+        threads = [threading.Thread(target=execute) for num in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(6, len(transports))
+        self.assertEqual(1, len(set(transports)))
+        self.assertEqual(1, self.pool.get_stats()['misses'])
+    
+    def test_broken_transport(self):
+        connection = self.pool.acquire('web.example.com')
+        connection.transport.active = False
+        self.pool.release(connection)
+        self.assertIsNot(connection, self.pool.acquire('web.example.com'))
+        self.assertEqual(2, self.pool.get_stats()['misses'])
+    
+    def test_idle_eviction(self):
+        connection = self.pool.acquire('web.example.com')
+        self.pool.release(connection)
+        connection.last_used = time.time()-120
+        self.pool.acquire('web1.example.com')
+        self.assertEqual(1, self.pool.get_stats()['evictions'])
+        self.assertFalse(connection.transport.is_active())
+    
+    def test_max_channels(self):
+        connection = self.pool.acquire('web.example.com')
+        self.pool.acquire('web.example.com')
+        self.assertFalse(connection.channels.acquire(blocking=False))
+    
+    def test_acquire_timeout(self):
+        pool = FakePool(max_channels=1, keepalive=0, idle_timeout=60, acquire_timeout=0.1)
+        pool.acquire('web.example.com')
+        self.assertRaises(socket.timeout, pool.acquire, 'web.example.com')
+    
+    def test_idle_agents(self):
+        connection, agent = self.pool.acquire_agent('web.example.com')
+        self.assertIsNone(agent)
+        # The connection is only looked up once
+        stats = self.pool.get_stats()
+        self.assertEqual((0, 1), (stats['hits'], stats['misses']))
+        agent = FakeAgent()
+        self.pool.release(connection, agent=agent)
+        # Idle agents keep their channel slot
+        self.assertTrue(connection.channels.acquire(blocking=False))
+        self.assertFalse(connection.channels.acquire(blocking=False))
+        connection.channels.release()
+        self.assertEqual((connection, agent), self.pool.acquire_agent('web.example.com'))
+        agent.channel.exited = True
+        self.pool.release(connection, agent=agent)
+        self.assertEqual((connection, None), self.pool.acquire_agent('web.example.com'))
+        self.assertTrue(agent.closed)
+    
+    def test_idle_agents_max_channels(self):
+        agents = []
+        for num in range(2):
+            connection = self.pool.acquire('web.example.com')
+            agents.append((connection, FakeAgent()))
+        for connection, agent in agents:
+            self.pool.release(connection, agent=agent)
+        # Idle agents are closed when other executions need their slot
+        self.pool.acquire('web.example.com')
+        self.assertEqual([False, True], [agent.closed for __, agent in agents])
@@ -1,11 +1,10 @@
 import datetime
-import lxml.builder
 import os
 from lxml import etree
 from lxml.builder import E
-from io import StringIO
 
 from django import forms
+from django.db.models.query import prefetch_related_objects
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django_iban.validators import IBANValidator, IBAN_COUNTRY_CODE_LENGTH
@@ -17,6 +16,20 @@ from .. import settings
 from .options import PaymentMethod
 
 
+_schemas = {}
+
+
+def get_schema(xsd):
+    """ Compiled XMLSchema of xsd, parsed only once per process """
+    try:
+        return _schemas[xsd]
+    except KeyError:
+        # http://www.iso20022.org/documents/messages/1_0_version/pain/schemas/pain.008.001.02.zip
+        path = os.path.dirname(os.path.realpath(__file__))
+        schema = _schemas[xsd] = etree.XMLSchema(etree.parse(os.path.join(path, xsd)))
+        return schema
+
+
 class SEPADirectDebitForm(PluginDataForm):
     iban = forms.CharField(label='IBAN',
             widget=forms.TextInput(attrs={'size': '50'}))
@@ -72,42 +85,34 @@ class SEPADirectDebit(PaymentMethod):
         process = TransactionProcess.objects.create()
         context = cls.get_context(transactions)
         # http://businessbanking.bankofireland.com/fs/doc/wysiwyg/b22440-mss130725-pain001-xml-file-structure-dec13.pdf
-        sepa = lxml.builder.ElementMaker(
-             nsmap = {
-                 'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-                 None: 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03',
-             }
-        )
-        sepa = sepa.Document(
-            E.CstmrCdtTrfInitn(
-                cls.get_header(context),
-                E.PmtInf(                                   # Payment Info
-                    E.PmtInfId(str(process.id)),            # Payment Id
-                    E.PmtMtd("TRF"),                        # Payment Method
-                    E.NbOfTxs(context['num_transactions']), # Number of Transactions
-                    E.CtrlSum(context['total']),            # Control Sum
-                    E.ReqdExctnDt(                          # Requested Execution Date
-                        (context['now']+datetime.timedelta(days=10)).strftime("%Y-%m-%d")
-                    ),
-                    E.Dbtr(                                 # Debtor
-                        E.Nm(context['name'])
-                    ),
-                    E.DbtrAcct(                             # Debtor Account
-                        E.Id(
-                            E.IBAN(context['iban'])
-                        )
-                    ),
-                    E.DbtrAgt(                              # Debtor Agent
-                        E.FinInstnId(                       # Financial Institution Id
-                            E.BIC(context['bic'])
-                        )
-                    ),
-                *list(cls.get_credit_transactions(transactions, process))   # Transactions
+        payment_info = (
+            E.PmtInfId(str(process.id)),            # Payment Id
+            E.PmtMtd("TRF"),                        # Payment Method
+            E.NbOfTxs(context['num_transactions']), # Number of Transactions
+            E.CtrlSum(context['total']),            # Control Sum
+            E.ReqdExctnDt(                          # Requested Execution Date
+                (context['now']+datetime.timedelta(days=10)).strftime("%Y-%m-%d")
+            ),
+            E.Dbtr(                                 # Debtor
+                E.Nm(context['name'])
+            ),
+            E.DbtrAcct(                             # Debtor Account
+                E.Id(
+                    E.IBAN(context['iban'])
                 )
-            )
+            ),
+            E.DbtrAgt(                              # Debtor Agent
+                E.FinInstnId(                       # Financial Institution Id
+                    E.BIC(context['bic'])
+                )
+            ),
         )
         file_name = 'credit-transfer-%i.xml' % process.id
-        cls.process_xml(sepa, 'pain.001.001.03.xsd', file_name, process)
+        cls.process_xml(process, file_name, 'pain.001.001.03.xsd',
+            'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03', 'CstmrCdtTrfInitn',
+            cls.get_header(context, process), payment_info,
+            cls.get_credit_transactions(transactions, process))
+        cls.mark_processed(transactions, process)
         return process
     
     @classmethod
@@ -116,51 +121,43 @@ class SEPADirectDebit(PaymentMethod):
         process = TransactionProcess.objects.create()
         context = cls.get_context(transactions)
         # http://businessbanking.bankofireland.com/fs/doc/wysiwyg/sepa-direct-debit-pain-008-001-02-xml-file-structure-july-2013.pdf
-        sepa = lxml.builder.ElementMaker(
-             nsmap = {
-                 'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-                 None: 'urn:iso:std:iso:20022:tech:xsd:pain.008.001.02',
-             }
-        )
-        sepa = sepa.Document(
-            E.CstmrDrctDbtInitn(
-                cls.get_header(context, process),
-                E.PmtInf(                                   # Payment Info
-                    E.PmtInfId(str(process.id)),            # Payment Id
-                    E.PmtMtd("DD"),                         # Payment Method
-                    E.NbOfTxs(context['num_transactions']), # Number of Transactions
-                    E.CtrlSum(context['total']),            # Control Sum
-                    E.PmtTpInf(                             # Payment Type Info
-                        E.SvcLvl(                           # Service Level
-                            E.Cd("SEPA")                    # Code
-                        ),
-                        E.LclInstrm(                        # Local Instrument
-                            E.Cd("CORE")                    # Code
-                        ),
-                        E.SeqTp("RCUR")                     # Sequence Type
-                    ),
-                    E.ReqdColltnDt(                         # Requested Collection Date
-                        context['now'].strftime("%Y-%m-%d")
-                    ),
-                    E.Cdtr(                                 # Creditor
-                        E.Nm(context['name'])
-                    ),
-                    E.CdtrAcct(                             # Creditor Account
-                        E.Id(
-                            E.IBAN(context['iban'])
-                        )
-                    ),
-                    E.CdtrAgt(                              # Creditor Agent
-                        E.FinInstnId(                       # Financial Institution Id
-                            E.BIC(context['bic'])
-                        )
-                    ),
-                *list(cls.get_debt_transactions(transactions, process))   # Transactions
+        payment_info = (
+            E.PmtInfId(str(process.id)),            # Payment Id
+            E.PmtMtd("DD"),                         # Payment Method
+            E.NbOfTxs(context['num_transactions']), # Number of Transactions
+            E.CtrlSum(context['total']),            # Control Sum
+            E.PmtTpInf(                             # Payment Type Info
+                E.SvcLvl(                           # Service Level
+                    E.Cd("SEPA")                    # Code
+                ),
+                E.LclInstrm(                        # Local Instrument
+                    E.Cd("CORE")                    # Code
+                ),
+                E.SeqTp("RCUR")                     # Sequence Type
+            ),
+            E.ReqdColltnDt(                         # Requested Collection Date
+                context['now'].strftime("%Y-%m-%d")
+            ),
+            E.Cdtr(                                 # Creditor
+                E.Nm(context['name'])
+            ),
+            E.CdtrAcct(                             # Creditor Account
+                E.Id(
+                    E.IBAN(context['iban'])
                 )
-            )
+            ),
+            E.CdtrAgt(                              # Creditor Agent
+                E.FinInstnId(                       # Financial Institution Id
+                    E.BIC(context['bic'])
+                )
+            ),
         )
         file_name = 'direct-debit-%i.xml' % process.id
-        cls.process_xml(sepa, 'pain.008.001.02.xsd', file_name, process)
+        cls.process_xml(process, file_name, 'pain.008.001.02.xsd',
+            'urn:iso:std:iso:20022:tech:xsd:pain.008.001.02', 'CstmrDrctDbtInitn',
+            cls.get_header(context, process), payment_info,
+            cls.get_debt_transactions(transactions, process))
+        cls.mark_processed(transactions, process)
         return process
     
     @classmethod
@@ -175,12 +172,18 @@ class SEPADirectDebit(PaymentMethod):
             'num_transactions': str(len(transactions)),
         }
     
+    @classmethod
+    def iter_transactions(cls, transactions, chunk_size=1000):
+        """ Loads the related accounts and sources of transactions one chunk at a time """
+        for ini in range(0, len(transactions), chunk_size):
+            chunk = transactions[ini:ini+chunk_size]
+            prefetch_related_objects(chunk, ['source', 'bill__account'])
+            for transaction in chunk:
+                yield transaction
+    
     @classmethod
     def get_debt_transactions(cls, transactions, process):
-        for transaction in transactions:
-            transaction.process = process
-            transaction.state = transaction.WAITTING_EXECUTION
-            transaction.save(update_fields=['state', 'process'])
+        for transaction in cls.iter_transactions(transactions):
             account = transaction.account
             data = transaction.source.data
             yield E.DrctDbtTxInf(                           # Direct Debit Transaction Info
@@ -217,11 +220,8 @@ class SEPADirectDebit(PaymentMethod):
             )
     
     @classmethod
-    def get_credit_transactions(transactions, process):
-        for transaction in transactions:
-            transaction.process = process
-            transaction.state = transaction.WAITTING_EXECUTION
-            transaction.save(update_fields=['state', 'process'])
+    def get_credit_transactions(cls, transactions, process):
+        for transaction in cls.iter_transactions(transactions):
             account = transaction.account
             data = transaction.source.data
             yield E.CdtTrfTxInf(                            # Credit Transfer Transaction Info
@@ -273,18 +273,45 @@ class SEPADirectDebit(PaymentMethod):
         )
     
     @classmethod
-    def process_xml(cls, sepa, xsd, file_name, process):
-        # http://www.iso20022.org/documents/messages/1_0_version/pain/schemas/pain.008.001.02.zip
-        path = os.path.dirname(os.path.realpath(__file__))
-        xsd_path = os.path.join(path, xsd)
-        schema_doc = etree.parse(xsd_path)
-        schema = etree.XMLSchema(schema_doc)
-        sepa = etree.parse(StringIO(etree.tostring(sepa)))
-        schema.assertValid(sepa)
+    def process_xml(cls, process, file_name, xsd, namespace, tag, header, payment_info, transactions):
+        """
+        Writes the SEPA document of process to its file as each transaction is generated
+        and validates it against xsd while parsing it back incrementally.
+        Memory usage does not depend on the number of transactions.
+        """
         process.file = file_name
+        path = process.file.path
+        nsmap = {
+            'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+            None: namespace,
+        }
+        with etree.xmlfile(path, encoding='UTF-8') as xf:
+            xf.write_declaration()
+            with xf.element('Document', nsmap=nsmap):
+                with xf.element(tag):
+                    xf.write(header, pretty_print=True)
+                    with xf.element('PmtInf'):                  # Payment Info
+                        for element in payment_info:
+                            xf.write(element, pretty_print=True)
+                        for element in transactions:
+                            xf.write(element, pretty_print=True)
+        try:
+            for __, element in etree.iterparse(path, schema=get_schema(xsd)):
+                # Only the elements being parsed are kept in memory
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        except etree.XMLSyntaxError:
+            os.remove(path)
+            raise
         process.save(update_fields=['file'])
-        sepa.write(process.file.path,
-                   pretty_print=True,
-                   xml_declaration=True,
-                   encoding='UTF-8')
-
+    
+    @classmethod
+    def mark_processed(cls, transactions, process):
+        """ Transactions are updated all at once, after their document has been validated """
+        from ..models import Transaction
+        Transaction.objects.filter(pk__in=[transaction.pk for transaction in transactions]).update(
+            process=process, state=Transaction.WAITTING_EXECUTION)
+        for transaction in transactions:
+            transaction.process = process
+            transaction.state = Transaction.WAITTING_EXECUTION
@@ -1,6 +1,7 @@
 import datetime
 import decimal
 
+from django.db.models import Sum
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
@@ -16,6 +17,21 @@ class Aggregation(plugins.Plugin, metaclass=plugins.PluginMount):
     def compute_usage(self, dataset):
         """ given a dataset computes its usage according to the method (avg, sum, ...) """
         raise NotImplementedError
+    
+    def filter_rollups(self, rollups):
+        """ Filter the daily MonitorRollups according to the period """
+        raise NotImplementedError
+    
+    def compute_rollup_usages(self, rollups):
+        """ {object_id: usage} of each object, using the pre-aggregated MonitorRollups """
+        raise NotImplementedError
+    
+    def compute_rollup_usage(self, rollups):
+        """ same as compute_usage() but using the pre-aggregated MonitorRollups """
+        usages = self.compute_rollup_usages(rollups)
+        if usages:
+            return sum(usages.values())
+        return None
 
 
 class Last(Aggregation):
@@ -25,7 +41,7 @@ class Last(Aggregation):
     
     def filter(self, dataset):
         try:
-            return dataset.order_by('object_id', '-id').distinct('monitor')
+            return dataset.order_by('object_id', '-created_at').distinct('monitor')
         except dataset.model.DoesNotExist:
             return dataset.none()
     
@@ -34,6 +50,13 @@ class Last(Aggregation):
         if values:
             return sum(values)
         return None
+    
+    def filter_rollups(self, rollups):
+        # Last rollup of each object
+        return rollups.order_by('object_id', '-date').distinct('object_id')
+    
+    def compute_rollup_usages(self, rollups):
+        return dict(rollups.values_list('object_id', 'last_value'))
 
 
 class MonthlySum(Last):
@@ -47,6 +70,15 @@ class MonthlySum(Last):
             created_at__year=today.year,
             created_at__month=today.month
         )
+    
+    def get_ini_date(self):
+        return timezone.localtime(timezone.now()).date().replace(day=1)
+    
+    def filter_rollups(self, rollups):
+        return rollups.filter(date__gte=self.get_ini_date())
+    
+    def compute_rollup_usages(self, rollups):
+        return dict(rollups.order_by().values_list('object_id').annotate(Sum('total')))
 
 
 class MonthlyAvg(MonthlySum):
@@ -60,7 +92,7 @@ class MonthlyAvg(MonthlySum):
     
     def get_epoch(self):
         today = timezone.now()
-        return datetime(
+        return datetime.datetime(
             year=today.year,
             month=today.month,
             day=1,
@@ -86,6 +118,21 @@ class MonthlyAvg(MonthlySum):
         if has_result:
             return result
         return None
+    
+    def compute_rollup_usages(self, rollups):
+        """ time-weighted average of each object """
+        usages = {}
+        rollups = rollups.order_by().values('object_id').annotate(
+            integral_sum=Sum('integral'), seconds_sum=Sum('seconds'), total_sum=Sum('total'),
+            count_sum=Sum('count'))
+        for rollup in rollups:
+            if rollup['seconds_sum']:
+                usage = rollup['integral_sum']/rollup['seconds_sum']
+            else:
+                # Values monitored at midnight do not last any second
+                usage = rollup['total_sum']/rollup['count_sum']
+            usages[rollup['object_id']] = usage
+        return usages
 
 
 class Last10DaysAvg(MonthlyAvg):
@@ -101,3 +148,7 @@ class Last10DaysAvg(MonthlyAvg):
     def filter(self, dataset):
         epoch = self.get_epoch()
         return dataset.filter(created_at__gt=epoch).order_by('created_at')
+    
+    def get_ini_date(self):
+        """ rollups are daily, the period starts at the beginning of the day """
+        return timezone.localtime(self.get_epoch()).date()
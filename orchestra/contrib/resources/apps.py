@@ -1,3 +1,5 @@
+import threading
+
 from django.apps import AppConfig
 
 from orchestra.utils import database_ready
@@ -6,16 +8,35 @@ from orchestra.utils import database_ready
 class ResourcesConfig(AppConfig):
     name = 'orchestra.contrib.resources'
     verbose_name = 'Resources'
+    # Version of the resource relations currently loaded by this process
+    version = None
+    lock = threading.Lock()
     
     def ready(self):
         if database_ready():
-            from .models import create_resource_relation
+            from .models import create_resource_relation, load_model_paths
+            self.version = self.get_version()
             create_resource_relation()
+            load_model_paths()
+    
+    def get_version(self):
+        """ Cheap stamp of the resources table, changes on any save or delete """
+        from django.db.models import Count, Max
+        from .models import Resource
+        stamp = Resource.objects.aggregate(Max('modified_at'), Count('id'))
+        return (stamp['modified_at__max'], stamp['id__count'])
     
     def reload_relations(self):
         from .admin import insert_resource_inlines
         from .models import create_resource_relation
         from .serializers import insert_resource_serializers
-        insert_resource_inlines()
-        insert_resource_serializers()
-        create_resource_relation()
+        with self.lock:
+            self.version = self.get_version()
+            insert_resource_inlines()
+            insert_resource_serializers()
+            create_resource_relation()
+    
+    def sync_relations(self):
+        """ Reloads the relations in-process when resources have been changed by another process """
+        if self.version is not None and self.get_version() != self.version:
+            self.reload_relations()
@@ -1,12 +1,22 @@
 import datetime
+import decimal
+import os
+import re
+import textwrap
+import time
+from contextlib import contextmanager
+from threading import local
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
 from orchestra.contrib.orchestration import ServiceBackend
 
+from . import settings
+
 
 class ServiceMonitor(ServiceBackend):
     TRAFFIC = 'traffic'
@@ -16,6 +26,27 @@ class ServiceMonitor(ServiceBackend):
     # TODO UNITS
     actions = ('monitor', 'exceeded', 'recovery')
     abstract = True
+    last_dates = None
+    # Thread local is used because monitors are instantiated by the orchestration manager
+    thread_locals = local()
+    
+    def __init__(self):
+        super(ServiceMonitor, self).__init__()
+        self.partial = getattr(self.thread_locals, 'partial', False)
+        self.incremental = bool(settings.RESOURCES_MONITOR_INCREMENTAL_LOGS and not self.partial)
+    
+    @classmethod
+    @contextmanager
+    def partial_run(cls):
+        """
+        Monitors instantiated within this block only cover some of the objects,
+        they read their logs from the start and leave the shared offsets untouched
+        """
+        cls.thread_locals.partial = True
+        try:
+            yield
+        finally:
+            cls.thread_locals.partial = False
     
     @classmethod
     def get_plugins(cls):
@@ -45,34 +76,204 @@ class ServiceMonitor(ServiceBackend):
                 monitor=self.get_name(), object_id=object_id).latest()
         except MonitorData.DoesNotExist:
             return None
-        
+    
+    def prefetch_last_dates(self, object_ids=None):
+        """
+        Fetches the last monitoring date of all the objects, or only object_ids, in one query
+        sparing get_last_date() one query per object
+        """
+        from .models import MonitorData
+        dataset = MonitorData.objects.filter(content_type=self.content_type, monitor=self.get_name())
+        if object_ids is not None:
+            dataset = dataset.filter(object_id__in=object_ids)
+        self.last_dates = dataset.get_last_dates()
+    
     def get_last_date(self, object_id):
-        data = self.get_last_data(object_id)
-        if data is None:
+        if self.last_dates is not None:
+            last_date = self.last_dates.get(object_id)
+        else:
+            data = self.get_last_data(object_id)
+            last_date = data.created_at if data else None
+        if last_date is None:
             return self.current_date - datetime.timedelta(days=1)
-        return data.created_at
+        return last_date
+    
+    def get_state_dir(self):
+        return os.path.join(settings.RESOURCES_MONITOR_STATE_DIR, self.get_name())
+    
+    def get_log_reader(self):
+        """
+        Python code for log parsing monitors, defines:
+            readlines(path): yields the lines of path.1 and path
+            commit_logs(): stores the read positions as pending checkpoints, call it once the
+                output has been printed. They are committed by commit_checkpoints() once the
+                panel has stored the output, a failed store leaves the lines to the next run.
+            incremental: in incremental mode only lines appended since the last run are read,
+                using the inode and offset checkpoint of each log file, rotated logs included
+        Offsets are shared by all the objects of a log file, partial runs are never incremental,
+        otherwise the lines of the objects left out would be skipped for good.
+        """
+        context = {
+            'incremental': self.incremental,
+            'state_dir': self.get_state_dir(),
+        }
+        return textwrap.dedent("""\
+            import binascii
+            import os
+            import sys
+            
+            incremental = %(incremental)s
+            state_dir = '%(state_dir)s'
+            checkpoints = {}
+            
+            def get_state_path(path):
+                return os.path.join(state_dir, path.strip('/').replace('/', '_') + '.offset')
+            
+            def get_sources(path):
+                # [(path, offset)] to be read, in chronological order
+                rotated = path + '.1'
+                if not incremental:
+                    return [(rotated, 0), (path, 0)]
+                try:
+                    with open(get_state_path(path)) as handle:
+                        inode, offset = map(int, handle.read().split())
+                except (IOError, ValueError):
+                    # First run, both files are read and lines are filtered by date
+                    return [(rotated, 0), (path, 0)]
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    return [(rotated, 0)]
+                if stat.st_ino == inode:
+                    # copytruncate rotation
+                    return [(path, offset if stat.st_size >= offset else 0)]
+                sources = []
+                try:
+                    if os.stat(rotated).st_ino == inode:
+                        # Rotated since the last run, read its remaining lines
+                        sources.append((rotated, offset))
+                except OSError:
+                    pass
+                sources.append((path, 0))
+                return sources
+            
+            def readlines(path):
+                for source, offset in get_sources(path):
+                    try:
+                        handle = open(source, 'rb')
+                    except IOError as e:
+                        # Missing rotated logs are expected
+                        if source == path:
+                            sys.stderr.write(str(e) + '\\n')
+                        continue
+                    try:
+                        handle.seek(offset)
+                        while True:
+                            line = handle.readline()
+                            if not line.endswith(b'\\n'):
+                                # Incomplete lines are left for the next run
+                                break
+                            offset += len(line)
+                            yield line
+                        if source == path:
+                            checkpoints[path] = (os.fstat(handle.fileno()).st_ino, offset)
+                    finally:
+                        handle.close()
+            
+            def commit_logs():
+                if not incremental:
+                    return
+                if not os.path.isdir(state_dir):
+                    os.makedirs(state_dir)
+                token = binascii.hexlify(os.urandom(8)).decode('ascii')
+                for path, checkpoint in checkpoints.items():
+                    with open(get_state_path(path) + '.' + token, 'w') as handle:
+                        handle.write('%%i %%i' %% checkpoint)
+                sys.stdout.write('# checkpoint %%s\\n' %% token)
+            """) % context
+    
+    def get_checkpoints_commit(self, token):
+        """ Python code that commits the pending checkpoints of token and drops day old ones """
+        context = {
+            'state_dir': self.get_state_dir(),
+            'token': token,
+        }
+        return textwrap.dedent("""\
+            import os
+            import time
+            
+            state_dir = '%(state_dir)s'
+            suffix = '.offset.%(token)s'
+            for name in os.listdir(state_dir):
+                path = os.path.join(state_dir, name)
+                if name.endswith(suffix):
+                    os.rename(path, path[:-len(suffix)] + '.offset')
+                elif '.offset.' in name and os.path.getmtime(path) < time.time()-86400:
+                    # Pending checkpoints of runs whose output has not been stored
+                    os.remove(path)
+            """) % context
+    
+    def commit_checkpoints(self, server, log):
+        """
+        Commits the log offsets read by the execution of log on server, once its output has been
+        stored, executed on its own BackendLog
+        """
+        from orchestra.contrib.orchestration.models import BackendLog
+        token = re.search(r'^# checkpoint ([0-9a-f]+)$', log.stdout, re.M)
+        if not token or log.state != BackendLog.SUCCESS:
+            return None
+        commit_log = BackendLog.objects.create(backend=self.get_name(), server=server,
+            state=BackendLog.STARTED)
+        self.script_method(commit_log, server, [self.get_checkpoints_commit(token.groups()[0])])
+        return commit_log
     
     def process(self, line):
         """ line -> object_id, value """
         return line.split()
     
-    def store(self, log):
-        """ stores monitored values from stdout """
-        from .models import MonitorData
-        name = self.get_name()
-        app_label, model_name = self.model.split('.')
-        ct = ContentType.objects.get_by_natural_key(app_label, model_name.lower())
-        for line in log.stdout.splitlines():
+    def parse(self, stdout):
+        """
+        Parses the monitor output into (object_ids, values) columns,
+        all the lines are validated before anything is stored, # comments are skipped
+        """
+        object_ids = []
+        values = []
+        for line in stdout.splitlines():
             line = line.strip()
+            if not line or line.startswith('#'):
+                continue
             try:
                 object_id, value = self.process(line)
-            except ValueError:
+                object_ids.append(int(object_id))
+                values.append(decimal.Decimal(value))
+            except (ValueError, decimal.InvalidOperation):
                 cls_name = self.__class__.__name__
                 raise ValueError("%s expected '<id> <value>' got '%s'" % (cls_name, line))
-            MonitorData.objects.create(monitor=name, object_id=object_id,
-                    content_type=ct, value=value, created_at=self.current_date)
+        return object_ids, values
+    
+    def store(self, log):
+        """ stores monitored values from stdout """
+        from .models import MonitorData, MonitorRollup
+        start = time.time()
+        object_ids, values = self.parse(log.stdout)
+        name = self.get_name()
+        ct = self.content_type
+        data = [
+            MonitorData(monitor=name, object_id=object_id, content_type=ct, value=value,
+                created_at=self.current_date) for object_id, value in zip(object_ids, values)
+        ]
+        with transaction.atomic():
+            MonitorData.objects.bulk_create(data, batch_size=settings.RESOURCES_MONITOR_STORE_BATCH_SIZE)
+            MonitorRollup.objects.ingest(name, ct,
+                [(obj.object_id, obj.value, obj.created_at) for obj in data])
+        elapsed = time.time()-start
+        rate = len(object_ids)/elapsed if elapsed else 0
+        # Reported on the monitor output, stderr is meant for errors
+        log.stdout += "# stored %i rows in %.2fs (%i rows/sec)\n" % (len(object_ids), elapsed, rate)
+        log.save(update_fields=['stdout'])
     
-    def execute(self, server, async=False):
-        log = super(ServiceMonitor, self).execute(server, async=async)
+    def execute(self, server, async=False, log=None):
+        log = super(ServiceMonitor, self).execute(server, async=async, log=log)
         self.store(log)
+        self.commit_checkpoints(server, log)
         return log
@@ -0,0 +1,10 @@
+from django.apps import apps
+
+
+class ResourceRelationsMiddleware(object):
+    """
+    Keeps the resource relations, admin inlines and API serializers of this process
+    up to date with the resources table, without restarting the WSGI workers
+    """
+    def process_request(self, request):
+        apps.get_app_config('resources').sync_relations()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from orchestra.contrib.resources import rollups
+
+
+def backfill_rollups(apps, schema_editor):
+    """ Builds the rollups of the already monitored data, in chronological chunks """
+    MonitorData = apps.get_model('resources', 'MonitorData')
+    MonitorRollup = apps.get_model('resources', 'MonitorRollup')
+    dataset = MonitorData.objects.order_by('id').values_list(
+        'id', 'monitor', 'content_type_id', 'object_id', 'value', 'created_at')
+    last_id = 0
+    while True:
+        chunk = list(dataset.filter(id__gt=last_id)[:10000])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        groups = {}
+        for __, monitor, content_type_id, object_id, value, created_at in chunk:
+            groups.setdefault((monitor, content_type_id), []).append((object_id, value, created_at))
+        for (monitor, content_type_id), data in groups.items():
+            rollups.ingest(MonitorRollup, monitor, content_type_id, data)
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('resources', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='MonitorRollup',
+            fields=[
+                ('id', models.AutoField(serialize=False, auto_created=True, verbose_name='ID', primary_key=True)),
+                ('monitor', models.CharField(choices=[('Apache2Traffic', '[M] Apache 2 Traffic'), ('DovecotMaildirDisk', '[M] Dovecot Maildir size'), ('Exim4Traffic', '[M] Exim4 traffic'), ('MailmanSubscribers', '[M] Mailman subscribers'), ('MailmanTraffic', '[M] Mailman traffic'), ('MysqlDisk', '[M] MySQL disk'), ('OpenVZTraffic', '[M] OpenVZTraffic'), ('PostfixMailscannerTraffic', '[M] Postfix-Mailscanner traffic'), ('UNIXUserDisk', '[M] UNIX user disk'), ('VsFTPdTraffic', '[M] VsFTPd traffic')], max_length=256, verbose_name='monitor')),
+                ('object_id', models.PositiveIntegerField(verbose_name='object id')),
+                ('date', models.DateField(verbose_name='date')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='count')),
+                ('total', models.DecimalField(default=0, decimal_places=2, max_digits=24, verbose_name='total')),
+                ('integral', models.DecimalField(default=0, help_text='Sum of each value multiplied by the seconds it has lasted.', decimal_places=2, max_digits=32, verbose_name='integral')),
+                ('seconds', models.PositiveIntegerField(default=0, verbose_name='seconds')),
+                ('last_value', models.DecimalField(null=True, decimal_places=2, max_digits=16, verbose_name='last value')),
+                ('last_at', models.DateTimeField(null=True, verbose_name='last')),
+                ('content_type', models.ForeignKey(verbose_name='content type', to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='monitorrollup',
+            unique_together=set([('monitor', 'content_type', 'object_id', 'date')]),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('resources', '0002_monitorrollup'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='resourcedata',
+            name='exceeded',
+            field=models.BooleanField(default=False, help_text='Whether the exceeded trigger has been executed without a later recovery.', editable=False, verbose_name='exceeded'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('resources', '0003_resourcedata_exceeded'),
+    ]
+    
+    operations = [
+        migrations.AlterModelOptions(
+            name='monitordata',
+            options={'get_latest_by': 'created_at', 'verbose_name_plural': 'monitor data'},
+        ),
+        migrations.AddField(
+            model_name='monitordata',
+            name='period',
+            field=models.CharField(blank=True, choices=[('', 'Raw'), ('hourly', 'Hourly'), ('daily', 'Daily')], help_text='Old values are downsampled into one value per hour or day.', default='', max_length=8, editable=False, verbose_name='period'),
+        ),
+        migrations.AlterField(
+            model_name='monitordata',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, db_index=True, verbose_name='created'),
+        ),
+        migrations.AlterIndexTogether(
+            name='monitordata',
+            index_together=set([('monitor', 'content_type', 'object_id', 'created_at')]),
+        ),
+    ]
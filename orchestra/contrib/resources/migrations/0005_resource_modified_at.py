@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.utils.timezone
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('resources', '0004_monitordata_period'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='modified'),
+            preserve_default=False,
+        ),
+    ]
@@ -1,7 +1,11 @@
+import decimal
+
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.apps import apps
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
@@ -9,11 +13,9 @@ from djcelery.models import PeriodicTask, CrontabSchedule
 
 from orchestra.core import validators
 from orchestra.models import queryset, fields
-from orchestra.models.utils import get_model_field_path
-from orchestra.utils.paths import get_project_dir
-from orchestra.utils.sys import run
+from orchestra.models.utils import get_model_field_path, get_model_field_lookup
 
-from . import tasks
+from . import rollups, settings, tasks
 from .backends import ServiceMonitor
 from .aggregations import Aggregation
 from .validators import validate_scale
@@ -72,6 +74,8 @@ class Resource(models.Model):
         choices=ServiceMonitor.get_choices(),
         help_text=_("Monitor backends used for monitoring this resource."))
     is_active = models.BooleanField(_("active"), default=True)
+    # Version stamp of the resource relations, see ResourcesConfig.get_version()
+    modified_at = models.DateTimeField(_("modified"), auto_now=True)
     
     objects = ResourceQuerySet.as_manager()
     
@@ -121,13 +125,13 @@ class Resource(models.Model):
         created = not self.pk
         super(Resource, self).save(*args, **kwargs)
         self.sync_periodic_task()
-        # This only work on tests (multiprocessing used on real deployments)
+        # Other processes reload them on their next request, see ResourceRelationsMiddleware
         apps.get_app_config('resources').reload_relations()
-        run('{ sleep 2 && touch %s/wsgi.py; } &' % get_project_dir(), async=True)
     
     def delete(self, *args, **kwargs):
         super(Resource, self).delete(*args, **kwargs)
         name = 'monitor.%s' % str(self)
+        apps.get_app_config('resources').reload_relations()
     
     def get_model_path(self, monitor):
         """ returns a model path between self.content_type and monitor.model """
@@ -135,6 +139,12 @@ class Resource(models.Model):
         monitor_model = ServiceMonitor.get_backend(monitor).model_class()
         return get_model_field_path(monitor_model, resource_model)
     
+    def get_model_lookup(self, monitor, lookup=''):
+        """ ORM lookup of the resource object from monitor.model objects """
+        resource_model = self.content_type.model_class()
+        monitor_model = ServiceMonitor.get_backend(monitor).model_class()
+        return get_model_field_lookup(monitor_model, resource_model, lookup)
+    
     def sync_periodic_task(self):
         name = 'monitor.%s' % str(self)
         if self.pk and self.crontab:
@@ -167,6 +177,75 @@ class Resource(models.Model):
         if async:
             return tasks.monitor.delay(self.pk, async=async)
         return tasks.monitor(self.pk, async=async)
+    
+    def get_usages(self, ids=None):
+        """
+        {object_id: used} of all the objects, or only ids,
+        computed with one aggregate query per monitor
+        """
+        aggregation = self.aggregation_instance
+        usages = {}
+        for monitor in self.monitors:
+            path = self.get_model_path(monitor)
+            monitor_model = ServiceMonitor.get_backend(monitor).model_class()
+            ct = ContentType.objects.get_for_model(monitor_model)
+            rollups = MonitorRollup.objects.filter(monitor=monitor, content_type=ct)
+            owners = None
+            if path == []:
+                if ids is not None:
+                    rollups = rollups.filter(object_id__in=ids)
+            else:
+                # Monitored objects are related to the resource objects
+                fields = self.get_model_lookup(monitor)
+                objects = monitor_model.objects.all()
+                if ids is not None:
+                    objects = objects.filter(**{self.get_model_lookup(monitor, 'in'): ids})
+                    rollups = rollups.filter(object_id__in=objects.values_list('id', flat=True))
+                owners = dict(objects.values_list('id', fields))
+            rollups = aggregation.filter_rollups(rollups)
+            for object_id, usage in aggregation.compute_rollup_usages(rollups).items():
+                if owners is not None:
+                    object_id = owners.get(object_id)
+                    if object_id is None:
+                        continue
+                usages[object_id] = usages.get(object_id, 0) + usage
+        scale = self.get_scale()
+        return {
+            object_id: float(usage)/scale for object_id, usage in usages.items()
+        }
+    
+    def update_dataset(self, ids=None):
+        """
+        Set-based update of the used value of all the objects, or only ids,
+        missing ResourceData are created in bulk
+        """
+        model = self.content_type.model_class()
+        objects = model.objects.all()
+        dataset = self.dataset.all()
+        if ids is not None:
+            objects = objects.filter(id__in=ids)
+            dataset = dataset.filter(object_id__in=ids)
+        object_ids = set(objects.values_list('id', flat=True))
+        existing = set(dataset.values_list('object_id', flat=True))
+        ResourceData.objects.bulk_create([
+            ResourceData(resource=self, content_type_id=self.content_type_id, object_id=object_id,
+                allocated=self.default_allocation) for object_id in object_ids - existing
+        ], batch_size=settings.RESOURCES_MONITOR_STORE_BATCH_SIZE)
+        usages = [
+            (object_id, usage) for object_id, usage in self.get_usages(ids).items() if usage
+        ]
+        batch_size = settings.RESOURCES_MONITOR_STORE_BATCH_SIZE
+        with transaction.atomic():
+            dataset.update(used=0, updated_at=timezone.now())
+            for ix in range(0, len(usages), batch_size):
+                batch = usages[ix:ix+batch_size]
+                dataset.filter(object_id__in=[object_id for object_id, __ in batch]).update(
+                    used=models.Case(*[
+                        models.When(object_id=object_id, then=models.Value(decimal.Decimal('%.3f' % usage)))
+                            for object_id, usage in batch
+                    ], output_field=models.DecimalField(max_digits=16, decimal_places=3))
+                )
+        return dataset
 
 
 class ResourceData(models.Model):
@@ -179,6 +258,8 @@ class ResourceData(models.Model):
     updated_at = models.DateTimeField(_("updated"), null=True, editable=False)
     allocated = models.DecimalField(_("allocated"), max_digits=8, decimal_places=2,
         null=True, blank=True)
+    exceeded = models.BooleanField(_("exceeded"), default=False, editable=False,
+        help_text=_("Whether the exceeded trigger has been executed without a later recovery."))
     
     content_object = GenericForeignKey()
     
@@ -213,8 +294,8 @@ class ResourceData(models.Model):
         resource = self.resource
         total = 0
         has_result = False
-        for dataset in self.get_monitor_datasets():
-            usage = resource.aggregation_instance.compute_usage(dataset)
+        for dataset in self.get_monitor_rollups():
+            usage = resource.aggregation_instance.compute_rollup_usage(dataset)
             if usage is not None:
                 has_result = True
                 total += usage
@@ -233,52 +314,81 @@ class ResourceData(models.Model):
             return tasks.monitor.delay(self.resource_id, ids=ids, async=async)
         return tasks.monitor(self.resource_id, ids=ids, async=async)
     
-    def get_monitor_datasets(self):
+    def get_monitor_querysets(self, model):
+        """ querysets of model (MonitorData or MonitorRollup) for each resource monitor """
         resource = self.resource
-        datasets = []
+        querysets = []
         for monitor in resource.monitors:
             path = resource.get_model_path(monitor)
             if path == []:
-                dataset = MonitorData.objects.filter(
+                queryset = model.objects.filter(
                     monitor=monitor,
                     content_type=self.content_type_id,
                     object_id=self.object_id
                 )
             else:
-                fields = '__'.join(path)
                 monitor_model = ServiceMonitor.get_backend(monitor).model_class()
-                objects = monitor_model.objects.filter(**{fields: self.object_id})
+                objects = monitor_model.objects.filter(**{
+                    resource.get_model_lookup(monitor): self.object_id
+                })
                 pks = objects.values_list('id', flat=True)
                 ct = ContentType.objects.get_for_model(monitor_model)
-                dataset = MonitorData.objects.filter(
+                queryset = model.objects.filter(
                     monitor=monitor,
                     content_type=ct,
                     object_id__in=pks
                 )
-            datasets.append(
-                resource.aggregation_instance.filter(dataset)
-            )
-        return datasets
+            querysets.append(queryset)
+        return querysets
+    
+    def get_monitor_datasets(self):
+        aggregation = self.resource.aggregation_instance
+        return [aggregation.filter(dataset) for dataset in self.get_monitor_querysets(MonitorData)]
+    
+    def get_monitor_rollups(self):
+        aggregation = self.resource.aggregation_instance
+        return [
+            aggregation.filter_rollups(dataset) for dataset in self.get_monitor_querysets(MonitorRollup)
+        ]
 
 
 class MonitorDataQuerySet(models.QuerySet):
     group_by = queryset.group_by
+    
+    def get_last_dates(self):
+        """ {object_id: creation date of its last value}, using a single grouped query """
+        return dict(self.order_by().values_list('object_id').annotate(models.Max('created_at')))
 
 
 class MonitorData(models.Model):
     """ Stores monitored data """
+    RAW = ''
+    HOURLY = 'hourly'
+    DAILY = 'daily'
+    PERIODS = (
+        (RAW, _("Raw")),
+        (HOURLY, _("Hourly")),
+        (DAILY, _("Daily")),
+    )
+    
     monitor = models.CharField(_("monitor"), max_length=256,
             choices=ServiceMonitor.get_choices())
     content_type = models.ForeignKey(ContentType, verbose_name=_("content type"))
     object_id = models.PositiveIntegerField(_("object id"))
-    created_at = models.DateTimeField(_("created"), default=timezone.now)
+    created_at = models.DateTimeField(_("created"), default=timezone.now, db_index=True)
     value = models.DecimalField(_("value"), max_digits=16, decimal_places=2)
+    period = models.CharField(_("period"), max_length=8, choices=PERIODS, default=RAW,
+        blank=True, editable=False,
+        help_text=_("Old values are downsampled into one value per hour or day."))
     
     content_object = GenericForeignKey()
     objects = MonitorDataQuerySet.as_manager()
     
     class Meta:
-        get_latest_by = 'id'
+        get_latest_by = 'created_at'
+        index_together = (
+            ('monitor', 'content_type', 'object_id', 'created_at'),
+        )
         verbose_name_plural = _("monitor data")
     
     def __str__(self):
@@ -289,6 +399,45 @@ class MonitorData(models.Model):
         return self.resource.unit
 
 
+class MonitorRollupQuerySet(models.QuerySet):
+    def ingest(self, monitor, content_type, data):
+        """ data: [(object_id, value, created_at)] """
+        content_type_id = getattr(content_type, 'pk', content_type)
+        rollups.ingest(self.model, monitor, content_type_id, data)
+
+
+class MonitorRollup(models.Model):
+    """ Daily aggregates of the monitored data of each object, updated on ingestion """
+    monitor = models.CharField(_("monitor"), max_length=256,
+            choices=ServiceMonitor.get_choices())
+    content_type = models.ForeignKey(ContentType, verbose_name=_("content type"))
+    object_id = models.PositiveIntegerField(_("object id"))
+    date = models.DateField(_("date"))
+    count = models.PositiveIntegerField(_("count"), default=0)
+    total = models.DecimalField(_("total"), max_digits=24, decimal_places=2, default=0)
+    integral = models.DecimalField(_("integral"), max_digits=32, decimal_places=2, default=0,
+        help_text=_("Sum of each value multiplied by the seconds it has lasted."))
+    seconds = models.PositiveIntegerField(_("seconds"), default=0)
+    last_value = models.DecimalField(_("last value"), max_digits=16, decimal_places=2, null=True)
+    last_at = models.DateTimeField(_("last"), null=True)
+    
+    objects = MonitorRollupQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ('monitor', 'content_type', 'object_id', 'date')
+    
+    def __str__(self):
+        return "%s %s" % (self.monitor, self.date)
+
+
+@receiver(post_save, sender=MonitorData, dispatch_uid='resources.rollup_monitor_data')
+def rollup_monitor_data(sender, instance, created, **kwargs):
+    """ ServiceMonitor.store() ingests its bulk inserted data by itself """
+    if created:
+        MonitorRollup.objects.ingest(instance.monitor, instance.content_type_id,
+            [(instance.object_id, instance.value, instance.created_at)])
+
+
 def create_resource_relation():
     class ResourceHandler(object):
         """ account.resources.web """
@@ -340,3 +489,14 @@ def create_resource_relation():
         model.add_to_class('resource_set', relation)
         model.resources = ResourceHandler()
         Resource._related.add(model)
+
+
+def load_model_paths():
+    """ Computes the model paths of all the resource monitors ahead of the first request """
+    for resource in Resource.objects.filter(is_active=True).select_related('content_type'):
+        for monitor in resource.monitors:
+            try:
+                resource.get_model_path(monitor)
+            except (KeyError, RuntimeError, LookupError):
+                # Reported by Resource.clean()
+                pass
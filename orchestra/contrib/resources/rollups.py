@@ -0,0 +1,131 @@
+import datetime
+import decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import settings
+
+
+def get_day(date):
+    """ local day of date, the one used by created_at__year and __month lookups """
+    if timezone.is_aware(date):
+        date = timezone.localtime(date)
+    return date.date()
+
+
+def get_day_start(day):
+    start = datetime.datetime.combine(day, datetime.time())
+    return timezone.make_aware(start, timezone.get_current_timezone())
+
+
+def ingest(model, monitor, content_type_id, data):
+    """
+    Accumulates data [(object_id, value, created_at)] into the daily rollups of monitor.
+    model is MonitorRollup, passed as an argument in order to be usable by migrations.
+    
+    Each rollup keeps the count, sum and time-weighted integral of the values of one object
+    on one day, every value weights the seconds elapsed since the previous value of the
+    same day (or since the start of the day).
+    Touched rollups are locked and replaced using one delete and a bulk insert. Rollups created
+    meanwhile by a concurrent ingestion make the insert fail, it is retried merging them as well.
+    """
+    if not data:
+        return
+    data = sorted(data, key=lambda d: d[2])
+    for attempt in range(3):
+        try:
+            with transaction.atomic():
+                return ingest_rollups(model, monitor, content_type_id, data)
+        except IntegrityError:
+            if attempt == 2:
+                raise
+
+
+def ingest_rollups(model, monitor, content_type_id, data):
+    object_ids = set(d[0] for d in data)
+    days = set(get_day(d[2]) for d in data)
+    dataset = model.objects.filter(monitor=monitor, content_type_id=content_type_id)
+    current = dataset.filter(object_id__in=object_ids, date__in=days)
+    rollups = {}
+    for rollup in current.select_for_update():
+        rollups[(rollup.object_id, rollup.date)] = rollup
+    last = dataset.filter(object_id__in=object_ids).order_by().values_list('object_id')
+    last = dict(last.annotate(Max('last_at')))
+    for object_id, value, created_at in data:
+        value = decimal.Decimal(value)
+        day = get_day(created_at)
+        try:
+            rollup = rollups[(object_id, day)]
+        except KeyError:
+            rollup = rollups[(object_id, day)] = model(monitor=monitor, object_id=object_id,
+                content_type_id=content_type_id, date=day)
+        ini = get_day_start(day)
+        last_at = last.get(object_id)
+        if last_at is not None and last_at > ini:
+            ini = last_at
+        seconds = max(int((created_at-ini).total_seconds()), 0)
+        rollup.count += 1
+        rollup.total += value
+        rollup.integral += value*seconds
+        rollup.seconds += seconds
+        if rollup.last_at is None or created_at >= rollup.last_at:
+            rollup.last_at = created_at
+            rollup.last_value = value
+            last[object_id] = created_at
+    for rollup in rollups.values():
+        rollup.pk = None
+    current.delete()
+    model.objects.bulk_create(rollups.values(), batch_size=settings.RESOURCES_MONITOR_STORE_BATCH_SIZE)
+
+
+def truncate(date, period):
+    """ local start of the hour or day of date """
+    date = timezone.localtime(date)
+    if period == 'daily':
+        date = date.replace(hour=0)
+    return date.replace(minute=0, second=0, microsecond=0)
+
+
+def merge(rows, additive):
+    """ Traffic like values are added up, levels (disk, memory, ...) keep the last value """
+    if additive:
+        return sum(row[4] for row in rows)
+    return rows[-1][4]
+
+
+def downsample(model, period, epoch):
+    """
+    Merges the MonitorData older than epoch into one value per object and hour or day,
+    period being 'hourly' or 'daily'. Processed one day at a time.
+    """
+    from .backends import ServiceMonitor
+    finer = ('', 'hourly') if period == 'daily' else ('',)
+    dataset = model.objects.filter(period__in=finer, created_at__lt=epoch)
+    additive = {}
+    for backend in ServiceMonitor.get_plugins():
+        additive[backend.get_name()] = backend.resource == ServiceMonitor.TRAFFIC
+    ini = dataset.order_by('created_at').values_list('created_at', flat=True).first()
+    if ini is None:
+        return
+    ini = truncate(ini, 'daily')
+    while ini < epoch:
+        end = min(get_day_start(ini.date() + datetime.timedelta(days=1)), epoch)
+        chunk = dataset.filter(created_at__gte=ini, created_at__lt=end)
+        rows = chunk.order_by('monitor', 'content_type', 'object_id', 'created_at').values_list(
+            'monitor', 'content_type_id', 'object_id', 'created_at', 'value')
+        groups = {}
+        for row in rows:
+            key = row[:3] + (truncate(row[3], period),)
+            groups.setdefault(key, []).append(row)
+        merged = [
+            model(monitor=monitor, content_type_id=content_type_id, object_id=object_id,
+                created_at=group[-1][3], value=merge(group, additive.get(monitor, False)),
+                period=period)
+                for (monitor, content_type_id, object_id, __), group in groups.items()
+        ]
+        with transaction.atomic():
+            chunk.delete()
+            model.objects.bulk_create(merged, batch_size=settings.RESOURCES_MONITOR_STORE_BATCH_SIZE)
+        ini = end
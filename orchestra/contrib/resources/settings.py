@@ -0,0 +1,39 @@
+from orchestra.settings import Setting
+
+
+RESOURCES_MONITOR_INCREMENTAL_LOGS = Setting('RESOURCES_MONITOR_INCREMENTAL_LOGS',
+    False,
+    help_text="Log parsing monitors only read the bytes appended since their previous run, "
+              "keeping inode and offset checkpoints on the monitored servers.",
+)
+
+
+RESOURCES_MONITOR_STATE_DIR = Setting('RESOURCES_MONITOR_STATE_DIR',
+    '/var/lib/orchestra/monitors',
+    help_text="Directory of the monitored servers where log checkpoints are kept.",
+)
+
+
+RESOURCES_MONITOR_STORE_BATCH_SIZE = Setting('RESOURCES_MONITOR_STORE_BATCH_SIZE',
+    1000,
+    help_text="Number of monitored values inserted per query.",
+)
+
+
+RESOURCES_MONITOR_DATA_HOURLY_DAYS = Setting('RESOURCES_MONITOR_DATA_HOURLY_DAYS',
+    32,
+    help_text="Monitored values older than this number of days are downsampled into one value per hour.",
+)
+
+
+RESOURCES_MONITOR_DATA_DAILY_DAYS = Setting('RESOURCES_MONITOR_DATA_DAILY_DAYS',
+    93,
+    help_text="Monitored values older than this number of days are downsampled into one value per day.",
+)
+
+
+RESOURCES_MONITOR_DATA_RETENTION_DAYS = Setting('RESOURCES_MONITOR_DATA_RETENTION_DAYS',
+    731,
+    help_text="Monitored values older than this number of days are deleted. "
+              "<tt>None</tt> keeps them forever. Resource usage is computed from daily rollups.",
+)
@@ -1,14 +1,21 @@
+from datetime import timedelta
+
 from celery import shared_task
+from celery.task.schedules import crontab
+from celery.decorators import periodic_task
+from django.db.models import F, Q
+from django.utils import timezone
 
 from orchestra.contrib.orchestration import Operation
-from orchestra.models.utils import get_model_field_path
+from orchestra.models.utils import get_model_field_lookup
 
+from . import rollups, settings
 from .backends import ServiceMonitor
 
 
 @shared_task(name='resources.Monitor')
 def monitor(resource_id, ids=None, async=True):
-    from .models import ResourceData, Resource
+    from .models import Resource
     
     resource = Resource.objects.get(pk=resource_id)
     resource_model = resource.content_type.model_class()
@@ -19,10 +26,8 @@ def monitor(resource_id, ids=None, async=True):
         model = backend.model_class()
         kwargs = {}
         if ids:
-            path = get_model_field_path(model, resource_model)
-            path = '%s__in' % ('__'.join(path) or 'id')
             kwargs = {
-                path: ids
+                get_model_field_lookup(model, resource_model, 'in'): ids
             }
         # Execute monitor
         monitorings = []
@@ -30,23 +35,41 @@ def monitor(resource_id, ids=None, async=True):
             op = Operation(backend, obj, Operation.MONITOR)
             monitorings.append(op)
         # TODO async=True only when running with celery
-        logs += Operation.execute(monitorings, async=async)
+        if ids:
+            with ServiceMonitor.partial_run():
+                logs += Operation.execute(monitorings, async=async)
+        else:
+            logs += Operation.execute(monitorings, async=async)
     
-    kwargs = {'id__in': ids} if ids else {}
-    # Update used resources and trigger resource exceeded and revovery
+    # Update used resources and trigger resource exceeded and recovery
+    dataset = resource.update_dataset(ids)
     triggers = []
-    model = resource.content_type.model_class()
-    for obj in model.objects.filter(**kwargs):
-        data, __ = ResourceData.get_or_create(obj, resource)
-        data.update()
-        if not resource.disable_trigger:
-            a = data.used
-            b = data.allocated
-            if data.used > (data.allocated or 0):
-                op = Operation(backend, obj, Operation.EXCEEDED)
-                triggers.append(op)
-            elif data.used < (data.allocated or 0):
-                op = Operation(backend, obj, Operation.RECOVERY)
-                triggers.append(op)
+    if not resource.disable_trigger:
+        # Only objects that have flipped their state since the last run
+        exceeds = Q(used__gt=F('allocated')) | Q(allocated__isnull=True, used__gt=0)
+        recovers = Q(used__lte=F('allocated')) | Q(allocated__isnull=True, used__lte=0)
+        flips = dataset.filter(Q(exceeds, exceeded=False) | Q(recovers, exceeded=True))
+        flips = dict(flips.values_list('object_id', 'exceeded'))
+        exceeded = [object_id for object_id, state in flips.items() if not state]
+        recovered = [object_id for object_id, state in flips.items() if state]
+        dataset.filter(object_id__in=exceeded).update(exceeded=True)
+        dataset.filter(object_id__in=recovered).update(exceeded=False)
+        for obj in resource_model.objects.filter(id__in=list(flips)):
+            action = Operation.RECOVERY if flips[obj.pk] else Operation.EXCEEDED
+            triggers.append(Operation(backend, obj, action))
     Operation.execute(triggers)
     return logs
+
+
+@periodic_task(run_every=crontab(hour=6, minute=30))
+def monitor_data_cleanup():
+    """ Downsamples old monitored data and deletes it after its retention period """
+    from .models import MonitorData
+    now = timezone.now()
+    retention = settings.RESOURCES_MONITOR_DATA_RETENTION_DAYS
+    if retention is not None:
+        MonitorData.objects.filter(created_at__lt=now-timedelta(days=retention)).delete()
+    epoch = now-timedelta(days=settings.RESOURCES_MONITOR_DATA_DAILY_DAYS)
+    rollups.downsample(MonitorData, MonitorData.DAILY, epoch)
+    epoch = now-timedelta(days=settings.RESOURCES_MONITOR_DATA_HOURLY_DAYS)
+    rollups.downsample(MonitorData, MonitorData.HOURLY, epoch)
@@ -0,0 +1,35 @@
+from orchestra.contrib.orchestration.models import BackendLog, Server
+from orchestra.contrib.systemusers.backends import VsFTPdTraffic
+from orchestra.utils.tests import BaseTestCase
+
+from ..models import MonitorData
+
+
+class ServiceMonitorStoreTests(BaseTestCase):
+    def test_store(self):
+        user = self.create_account().systemusers.get()
+        server = Server.objects.create(name='ftp.example.com')
+        log = BackendLog.objects.create(backend=VsFTPdTraffic.get_name(), server=server,
+            stdout='%i 1024\n%i 2048\n' % (user.pk, user.pk))
+        VsFTPdTraffic().store(log)
+        self.assertEqual(2, MonitorData.objects.filter(monitor=VsFTPdTraffic.get_name()).count())
+        log = BackendLog.objects.get(pk=log.pk)
+        self.assertRegex(log.stdout, r'# stored 2 rows in [0-9.]+s \([0-9]+ rows/sec\)\n$')
+        self.assertEqual('', log.stderr)
+        # Stored logs can be parsed again
+        self.assertEqual([user.pk, user.pk], VsFTPdTraffic().parse(log.stdout)[0])
+    
+    def test_commit_checkpoints(self):
+        server = Server.objects.create(name='ftp.example.com')
+        scripts = []
+        monitor = VsFTPdTraffic()
+        monitor.script_method = lambda log, server, cmds: scripts.append('\n'.join(cmds))
+        log = BackendLog.objects.create(backend=VsFTPdTraffic.get_name(), server=server,
+            state=BackendLog.FAILURE, stdout='# checkpoint 0a1b\n')
+        # Offsets are left untouched until the output has been stored
+        self.assertIsNone(monitor.commit_checkpoints(server, log))
+        log.state = BackendLog.SUCCESS
+        commit_log = monitor.commit_checkpoints(server, log)
+        self.assertEqual(server, commit_log.server)
+        self.assertEqual(1, len(scripts))
+        self.assertIn("suffix = '.offset.0a1b'", scripts[0])
@@ -130,10 +130,12 @@ class Exim4Traffic(ServiceMonitor):
     )
     
     def prepare(self):
+        self.prefetch_last_dates()
+        self.append(self.get_log_reader())
         mainlog = settings.SYSTEMUSERS_MAIL_LOG_PATH
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'mainlogs': str((mainlog, mainlog+'.1')),
+            'mainlog': mainlog,
         }
         self.append(textwrap.dedent("""\
             import re
@@ -147,10 +149,13 @@ class Exim4Traffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            mainlogs = {mainlogs}
+            mainlog = '{mainlog}'
             # Use local timezone
             end_date = to_local_timezone('{current_date}')
             end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
+            if incremental:
+                # Lines are only read once, the ones logged after current_date can not be left behind
+                end_date = 99999999999999
             users = {{}}
             
             def prepare(object_id, username, ini_date):
@@ -159,26 +164,21 @@ class Exim4Traffic(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 users[username] = [ini_date, object_id, 0]
             
-            def monitor(users, end_date, mainlogs):
+            def monitor(users, end_date, mainlog):
                 user_regex = re.compile(r' U=([^ ]+) ')
-                for mainlog in mainlogs:
-                    try:
-                        with open(mainlog, 'r') as mainlog:
-                            for line in mainlog.readlines():
-                                if ' <= ' in line and 'P=local' in line:
-                                    username = user_regex.search(line).groups()[0]
-                                    try:
-                                        sender = users[username]
-                                    except KeyError:
-                                        continue
-                                    else:
-                                        date, time, id, __, __, user, protocol, size = line.split()[:8]
-                                        date = date.replace('-', '')
-                                        date += time.replace(':', '')
-                                        if sender[0] < int(date) < end_date:
-                                            sender[2] += int(size[2:])
-                    except IOError as e:
-                        sys.stderr.write(e)
+                for line in readlines(mainlog):
+                    if ' <= ' in line and 'P=local' in line:
+                        username = user_regex.search(line).groups()[0]
+                        try:
+                            sender = users[username]
+                        except KeyError:
+                            continue
+                        else:
+                            date, time, id, __, __, user, protocol, size = line.split()[:8]
+                            date = date.replace('-', '')
+                            date += time.replace(':', '')
+                            if sender[0] < int(date) < end_date:
+                                sender[2] += int(size[2:])
                 
                 for username, opts in users.iteritems():
                     __, object_id, size = opts
@@ -187,7 +187,8 @@ class Exim4Traffic(ServiceMonitor):
         )
     
     def commit(self):
-        self.append('monitor(users, end_date, mainlogs)')
+        self.append('monitor(users, end_date, mainlog)')
+        self.append('commit_logs()')
     
     def monitor(self, user):
         context = self.get_context(user)
@@ -215,10 +216,12 @@ class VsFTPdTraffic(ServiceMonitor):
     )
     
     def prepare(self):
+        self.prefetch_last_dates()
+        self.append(self.get_log_reader())
         vsftplog = settings.SYSTEMUSERS_FTP_LOG_PATH
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'vsftplogs': str((vsftplog, vsftplog+'.1')),
+            'vsftplog': vsftplog,
         }
         self.append(textwrap.dedent("""\
             import re
@@ -232,10 +235,13 @@ class VsFTPdTraffic(ServiceMonitor):
                 date = date.astimezone(tzlocal)
                 return date
             
-            vsftplogs = {vsftplogs}
+            vsftplog = '{vsftplog}'
             # Use local timezone
             end_date = to_local_timezone('{current_date}')
             end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
+            if incremental:
+                # Lines are only read once, the ones logged after current_date can not be left behind
+                end_date = 99999999999999
             users = {{}}
             months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
             months = dict((m, '%02d' % n) for n, m in enumerate(months, 1))
@@ -246,27 +252,22 @@ class VsFTPdTraffic(ServiceMonitor):
                 ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
                 users[username] = [ini_date, object_id, 0]
             
-            def monitor(users, end_date, months, vsftplogs):
+            def monitor(users, end_date, months, vsftplog):
                 user_regex = re.compile(r'\] \[([^ ]+)\] (OK|FAIL) ')
                 bytes_regex = re.compile(r', ([0-9]+) bytes, ')
-                for vsftplog in vsftplogs:
-                    try:
-                        with open(vsftplog, 'r') as vsftplog:
-                            for line in vsftplog.readlines():
-                                if ' bytes, ' in line:
-                                    username = user_regex.search(line).groups()[0]
-                                    try:
-                                        user = users[username]
-                                    except KeyError:
-                                        continue
-                                    else:
-                                        __, month, day, time, year = line.split()[:5]
-                                        date = year + months[month] + day + time.replace(':', '')
-                                        if user[0] < int(date) < end_date:
-                                            bytes = bytes_regex.search(line).groups()[0]
-                                            user[2] += int(bytes)
-                    except IOError as e:
-                        sys.stderr.write(e)
+                for line in readlines(vsftplog):
+                    if ' bytes, ' in line:
+                        username = user_regex.search(line).groups()[0]
+                        try:
+                            user = users[username]
+                        except KeyError:
+                            continue
+                        else:
+                            __, month, day, time, year = line.split()[:5]
+                            date = year + months[month] + day + time.replace(':', '')
+                            if user[0] < int(date) < end_date:
+                                bytes = bytes_regex.search(line).groups()[0]
+                                user[2] += int(bytes)
                 
                 for username, opts in users.items():
                     __, object_id, size = opts
@@ -279,7 +280,8 @@ class VsFTPdTraffic(ServiceMonitor):
         self.append("prepare(%(object_id)s, '%(username)s', '%(last_date)s')" % context)
     
     def commit(self):
-        self.append('monitor(users, end_date, months, vsftplogs)')
+        self.append('monitor(users, end_date, months, vsftplog)')
+        self.append('commit_logs()')
     
     def get_context(self, user):
         context = {
@@ -1,10 +1,9 @@
 import os
 import textwrap
 
-from django.template import Template, Context
 from django.utils.translation import ugettext_lazy as _
 
-from orchestra.contrib.orchestration import ServiceController, replace
+from orchestra.contrib.orchestration import ServiceController, render_template, replace
 
 from . import WebAppServiceMixin
 from .. import settings
@@ -152,7 +151,7 @@ class PHPBackend(WebAppServiceMixin, ServiceController):
             'request_terminate_timeout': options.get('timeout', False),
         })
         context['fpm_listen'] = webapp.type_instance.FPM_LISTEN % context
-        fpm_config = Template(textwrap.dedent("""\
+        return render_template("""\
             ;; {{ banner }}
             [{{ user }}]
             user = {{ user }}
@@ -167,9 +166,7 @@ class PHPBackend(WebAppServiceMixin, ServiceController):
             {% if request_terminate_timeout %}request_terminate_timeout = {{ request_terminate_timeout }}{% endif %}
             {% for name, value in init_vars.items %}
             php_admin_value[{{ name | safe }}] = {{ value | safe }}{% endfor %}
-            """
-        ))
-        return fpm_config.render(Context(context))
+            """, context)
     
     def get_fcgid_wrapper(self, webapp, context):
         opt = webapp.type_instance
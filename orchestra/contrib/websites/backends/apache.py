@@ -2,10 +2,9 @@ import os
 import re
 import textwrap
 
-from django.template import Template, Context
 from django.utils.translation import ugettext_lazy as _
 
-from orchestra.contrib.orchestration import ServiceController, replace
+from orchestra.contrib.orchestration import ServiceController, render_template, replace
 from orchestra.contrib.resources import ServiceMonitor
 
 from .. import settings
@@ -27,6 +26,12 @@ class Apache2Backend(ServiceController):
         ('websites.WebsiteDirective', 'website'),
         ('webapps.WebApp', 'website_set'),
     )
+    prefetch_related = (
+        'account__main_systemuser',
+        'domains',
+        'directives',
+        'content_set__webapp__account__main_systemuser',
+    )
     verbose_name = _("Apache 2")
     doc_settings = (settings, (
         'WEBSITES_VHOST_EXTRA_DIRECTIVES',
@@ -54,7 +59,7 @@ class Apache2Backend(ServiceController):
         # Order extra conf directives based on directives (longer first)
         extra_conf = sorted(extra_conf, key=lambda a: len(a[0]), reverse=True)
         context['extra_conf'] = '\n'.join([conf for location, conf in extra_conf])
-        return Template(textwrap.dedent("""\
+        return render_template("""\
             <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
                 IncludeOptional /etc/apache2/site[s]-override/{{ site_unique_name }}.con[f]
                 ServerName {{ server_name }}\
@@ -68,12 +73,11 @@ class Apache2Backend(ServiceController):
             {% for line in extra_conf.splitlines %}
                 {{ line | safe }}{% endfor %}
             </VirtualHost>
-            """)
-        ).render(Context(context))
+            """, context)
     
     def render_redirect_https(self, context):
         context['port'] = self.HTTP_PORT
-        return Template(textwrap.dedent("""
+        return render_template("""
             <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
                 ServerName {{ server_name }}\
             {% if server_alias %}
@@ -86,8 +90,7 @@ class Apache2Backend(ServiceController):
                 RewriteCond %{HTTPS} off
                 RewriteRule (.*) https://%{HTTP_HOST}%{REQUEST_URI}
             </VirtualHost>
-            """)
-        ).render(Context(context))
+            """, context)
     
     def save(self, site):
         context = self.get_context(site)
@@ -258,7 +261,7 @@ class Apache2Backend(ServiceController):
         return [
             ('', config),
         ]
-        
+    
     def get_security(self, directives):
         security = []
         for values in directives.get('sec-rule-remove', []):
@@ -332,7 +335,8 @@ class Apache2Backend(ServiceController):
     def get_server_names(self, site):
         server_name = None
         server_alias = []
-        for domain in site.domains.all().order_by('name'):
+        # Sorted in python, order_by() would not use the prefetched domains
+        for domain in sorted(site.domains.all(), key=lambda domain: domain.name):
             if not server_name and not domain.name.startswith('*'):
                 server_name = domain.name
             else:
@@ -378,68 +382,144 @@ class Apache2Traffic(ServiceMonitor):
     """
     Parses apache logs,
     looking for the size of each request on the last word of the log line.
+    Incremental log reading requires python and python-dateutil on the web servers,
+    otherwise the logs are parsed with awk.
     """
     model = 'websites.Website'
     resource = ServiceMonitor.TRAFFIC
     verbose_name = _("Apache 2 Traffic")
+    script_executable = '/usr/bin/python'
     doc_settings = (settings,
         ('WEBSITES_TRAFFIC_IGNORE_HOSTS',)
     )
+    def __init__(self):
+        super(Apache2Traffic, self).__init__()
+        if not self.incremental:
+            self.script_executable = '/bin/bash'
+    
     def prepare(self):
-        super(Apache2Traffic, self).prepare()
-        ignore_hosts = '\\|'.join(settings.WEBSITES_TRAFFIC_IGNORE_HOSTS)
+        self.prefetch_last_dates()
+        if not self.incremental:
+            super(Apache2Traffic, self).prepare()
+            ignore_hosts = '\\|'.join(settings.WEBSITES_TRAFFIC_IGNORE_HOSTS)
+            context = {
+                'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
+                'ignore_hosts': '-v "%s"' % ignore_hosts if ignore_hosts else '',
+            }
+            self.append(textwrap.dedent("""\
+                function monitor () {
+                    OBJECT_ID=$1
+                    INI_DATE=$(date "+%%Y%%m%%d%%H%%M%%S" -d "$2")
+                    END_DATE=$(date '+%%Y%%m%%d%%H%%M%%S' -d '%(current_date)s')
+                    LOG_FILE="$3"
+                    {
+                        { grep %(ignore_hosts)s ${LOG_FILE} || echo -e '\\r'; } \\
+                            | awk -v ini="${INI_DATE}" -v end="${END_DATE}" '
+                                BEGIN {
+                                    sum = 0
+                                    months["Jan"] = "01"
+                                    months["Feb"] = "02"
+                                    months["Mar"] = "03"
+                                    months["Apr"] = "04"
+                                    months["May"] = "05"
+                                    months["Jun"] = "06"
+                                    months["Jul"] = "07"
+                                    months["Aug"] = "08"
+                                    months["Sep"] = "09"
+                                    months["Oct"] = "10"
+                                    months["Nov"] = "11"
+                                    months["Dec"] = "12"
+                                } {
+                                    # date = [11/Jul/2014:13:50:41
+                                    date = substr($4, 2)
+                                    year = substr(date, 8, 4)
+                                    month = months[substr(date, 4, 3)];
+                                    day = substr(date, 1, 2)
+                                    hour = substr(date, 13, 2)
+                                    minute = substr(date, 16, 2)
+                                    second = substr(date, 19, 2)
+                                    line_date = year month day hour minute second
+                                    if ( line_date > ini && line_date < end)
+                                        sum += $NF
+                                } END {
+                                    print sum
+                                }' || [[ $? == 1 ]] && true
+                    } | xargs echo ${OBJECT_ID}
+                }""") % context)
+            return
+        self.append(self.get_log_reader())
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'ignore_hosts': '-v "%s"' % ignore_hosts if ignore_hosts else '',
+            'ignore_hosts': str(tuple(settings.WEBSITES_TRAFFIC_IGNORE_HOSTS)),
         }
         self.append(textwrap.dedent("""\
-            function monitor () {
-                OBJECT_ID=$1
-                INI_DATE=$(date "+%%Y%%m%%d%%H%%M%%S" -d "$2")
-                END_DATE=$(date '+%%Y%%m%%d%%H%%M%%S' -d '%(current_date)s')
-                LOG_FILE="$3"
-                {
-                    { grep %(ignore_hosts)s ${LOG_FILE} || echo -e '\\r'; } \\
-                        | awk -v ini="${INI_DATE}" -v end="${END_DATE}" '
-                            BEGIN {
-                                sum = 0
-                                months["Jan"] = "01"
-                                months["Feb"] = "02"
-                                months["Mar"] = "03"
-                                months["Apr"] = "04"
-                                months["May"] = "05"
-                                months["Jun"] = "06"
-                                months["Jul"] = "07"
-                                months["Aug"] = "08"
-                                months["Sep"] = "09"
-                                months["Oct"] = "10"
-                                months["Nov"] = "11"
-                                months["Dec"] = "12"
-                            } {
-                                # date = [11/Jul/2014:13:50:41
-                                date = substr($4, 2)
-                                year = substr(date, 8, 4)
-                                month = months[substr(date, 4, 3)];
-                                day = substr(date, 1, 2)
-                                hour = substr(date, 13, 2)
-                                minute = substr(date, 16, 2)
-                                second = substr(date, 19, 2)
-                                line_date = year month day hour minute second
-                                if ( line_date > ini && line_date < end)
-                                    sum += $NF
-                            } END {
-                                print sum
-                            }' || [[ $? == 1 ]] && true
-                } | xargs echo ${OBJECT_ID}
-            }""") % context)
+            import sys
+            from datetime import datetime
+            from dateutil import tz
+            
+            def to_local_timezone(date, tzlocal=tz.tzlocal()):
+                date = datetime.strptime(date, '%Y-%m-%d %H:%M:%S %Z')
+                date = date.replace(tzinfo=tz.tzutc())
+                date = date.astimezone(tzlocal)
+                return date
+            
+            ignore_hosts = {ignore_hosts}
+            # Use local timezone
+            end_date = to_local_timezone('{current_date}')
+            end_date = int(end_date.strftime('%Y%m%d%H%M%S'))
+            if incremental:
+                # Lines are only read once, the ones logged after current_date can not be left behind
+                end_date = 99999999999999
+            months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+            months = dict((m, '%02d' % n) for n, m in enumerate(months, 1))
+            sites = {{}}
+            
+            def prepare(object_id, log_file, ini_date):
+                global sites
+                ini_date = to_local_timezone(ini_date)
+                ini_date = int(ini_date.strftime('%Y%m%d%H%M%S'))
+                sites.setdefault(log_file, []).append([ini_date, object_id, 0])
+            
+            def monitor(sites, end_date, months, ignore_hosts):
+                for log_file, opts in sites.items():
+                    for line in readlines(log_file):
+                        if any(host in line for host in ignore_hosts):
+                            continue
+                        line = line.split()
+                        try:
+                            # date = [11/Jul/2014:13:50:41
+                            date = line[3][1:]
+                            date = date[7:11] + months[date[3:6]] + date[:2] + date[12:].replace(':', '')
+                            size = int(line[-1])
+                        except (IndexError, KeyError, ValueError):
+                            # not interested in this line
+                            continue
+                        for site in opts:
+                            if site[0] < int(date) < end_date:
+                                site[2] += size
+                    for __, object_id, size in opts:
+                        print object_id, size
+            """).format(**context)
+        )
+    
+    def commit(self):
+        if not self.incremental:
+            super(Apache2Traffic, self).commit()
+            return
+        self.append('monitor(sites, end_date, months, ignore_hosts)')
+        self.append('commit_logs()')
     
     def monitor(self, site):
         context = self.get_context(site)
-        self.append('monitor {object_id} "{last_date}" {log_file}'.format(**context))
+        if self.incremental:
+            self.append("prepare(%(object_id)s, '%(log_file)s', '%(last_date)s')" % context)
+        else:
+            self.append('monitor {object_id} "{last_date}" {log_file}'.format(**context))
     
     def get_context(self, site):
+        log_file = site.get_www_access_log_path()
         context = {
-            'log_file': '%s{,.1}' % site.get_www_access_log_path(),
+            'log_file': log_file if self.incremental else '%s{,.1}' % log_file,
             'last_date': self.get_last_date(site.pk).strftime("%Y-%m-%d %H:%M:%S %Z"),
             'object_id': site.pk,
         }
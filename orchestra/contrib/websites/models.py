@@ -71,7 +71,8 @@ class Website(models.Model):
     @cached
     def get_directives(self):
         directives = OrderedDict()
-        for opt in self.directives.all().order_by('name', 'value'):
+        # Sorted in python, order_by() would not use the prefetched directives
+        for opt in sorted(self.directives.all(), key=lambda opt: (opt.name, opt.value)):
             try:
                 directives[opt.name].append(opt.value)
             except KeyError:
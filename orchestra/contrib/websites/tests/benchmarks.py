@@ -0,0 +1,94 @@
+"""
+Benchmarks, not collected by the test runner
+    
+    python manage.py test orchestra.contrib.websites.tests.benchmarks
+"""
+import sys
+import time
+
+from django.test import SimpleTestCase
+
+from orchestra.contrib.orchestration import backends
+
+from ..backends.apache import Apache2Backend
+
+
+class FakeContents(object):
+    def all(self):
+        return []
+
+
+class FakeWebsite(object):
+    """ HTTPS website with a few directives, without touching the database """
+    content_set = FakeContents()
+    
+    def __init__(self, num):
+        self.num = num
+    
+    def get_directives(self):
+        return {
+            'ssl-cert': ['/etc/ssl/certs/site%i.pem' % self.num],
+            'ssl-key': ['/etc/ssl/private/site%i.key' % self.num],
+            'redirect': ['/old https://site%i.example.com/new' % self.num],
+            'proxy': ['/app http://127.0.0.1:8080/'],
+            'sec-rule-remove': ['960015 960024'],
+        }
+    
+    def get_settings_context(self):
+        return {
+            'id': self.num,
+            'pk': self.num,
+            'home': '/home/user%i' % self.num,
+            'user': 'user%i' % self.num,
+            'group': 'user%i' % self.num,
+            'site_name': 'site%i' % self.num,
+            'protocol': 'https',
+        }
+
+
+class VirtualHostRenderBenchmark(SimpleTestCase):
+    SITES = 10000
+    
+    def get_context(self, num):
+        return {
+            'ips': ('*',),
+            'site_unique_name': 'user%i-site%i' % (num, num),
+            'server_name': 'site%i.example.com' % num,
+            'server_alias': ('www.site%i.example.com' % num,),
+            'access_log': '/var/log/apache2/virtual/site%i.log' % num,
+            'error_log': '/var/log/apache2/virtual/site%i.error' % num,
+            'user': 'user%i' % num,
+            'group': 'user%i' % num,
+        }
+    
+    def render(self, render, cached):
+        """ cold cache: the template is parsed for every site, warm cache: it is compiled once """
+        backends._templates.clear()
+        start = time.time()
+        for num in range(self.SITES):
+            if not cached:
+                backends._templates.clear()
+            config = render(num)
+        return time.time()-start, config
+    
+    def benchmark(self, name, render):
+        cold, config = self.render(render, cached=False)
+        warm, cached_config = self.render(render, cached=True)
+        sys.stderr.write(
+            "%i %s: cold cache %.4fs, warm cache %.4fs (x%.1f)\n" % (
+                self.SITES, name, cold, warm, cold/warm)
+        )
+        self.assertEqual(config, cached_config)
+        self.assertLess(warm, cold)
+        return config
+    
+    def test_render(self):
+        backend = Apache2Backend()
+        sys.stderr.write("\n")
+        config = self.benchmark('HTTPS virtual hosts',
+            lambda num: backend.render_virtual_host(FakeWebsite(num), self.get_context(num), ssl=True))
+        self.assertIn('ServerName site%i.example.com' % (self.SITES-1), config)
+        self.assertIn('SSLCertificateFile /etc/ssl/certs/site%i.pem' % (self.SITES-1), config)
+        config = self.benchmark('HTTPS redirects',
+            lambda num: backend.render_redirect_https(self.get_context(num)))
+        self.assertIn('RewriteEngine On', config)
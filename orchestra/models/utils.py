@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db.models import loading
+from django.db.models.signals import class_prepared
 import importlib
 
 
@@ -28,7 +29,7 @@ def get_field_value(obj, field_name):
     return rel
 
 
-def get_model_field_path(origin, target):
+def find_model_field_path(origin, target):
     """ BFS search on model relaion fields """
     queue = []
     queue.append(([origin], []))
@@ -48,3 +49,41 @@ def get_model_field_path(origin, target):
                 new_path.append(field.name)
                 queue.append((new_model, new_path))
     raise LookupError("Path does not exists between '%s' and '%s' models" % (origin, target))
+
+
+_model_field_paths = {}
+
+
+def clear_model_field_paths(*args, **kwargs):
+    _model_field_paths.clear()
+
+
+# Paths are computed again when models are added to the app registry
+class_prepared.connect(clear_model_field_paths)
+
+
+def get_model_field_path(origin, target):
+    """ Cached find_model_field_path(), paths are computed once per process """
+    key = (origin, target)
+    try:
+        path = _model_field_paths[key]
+    except KeyError:
+        try:
+            path = find_model_field_path(origin, target)
+        except (RuntimeError, LookupError) as exc:
+            path = (type(exc), str(exc))
+        _model_field_paths[key] = path
+    if isinstance(path, tuple):
+        raise path[0](path[1])
+    return list(path)
+
+
+def get_model_field_lookup(origin, target, lookup=''):
+    """
+    ORM lookup of the target primary key from origin, e.g. 'account__in'
+    Filtering or getting values_list() on origin with it follows the path within a single query.
+    """
+    path = get_model_field_path(origin, target) or ['id']
+    if lookup:
+        path.append(lookup)
+    return '__'.join(path)
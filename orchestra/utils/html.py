@@ -1,12 +1,104 @@
+import atexit
+import os
+import queue
+import subprocess
+import threading
+from contextlib import contextmanager
+
 from orchestra.utils.sys import run
 
 
-def html_to_pdf(html):
-    """ converts HTL to PDF using wkhtmltopdf """
-    return run(
-        'PATH=$PATH:/usr/local/bin/\n'
-        'xvfb-run -a -s "-screen 0 640x4800x16" '
-            'wkhtmltopdf -q --footer-center "Page [page] of [topage]" '
-            '   --footer-font-size 9 --margin-bottom 20 --margin-top 20 - -',
-        stdin=html.encode('utf-8')
-    ).stdout
+WKHTMLTOPDF = (
+    'wkhtmltopdf -q --footer-center "Page [page] of [topage]" '
+    '   --footer-font-size 9 --margin-bottom 20 --margin-top 20 - -'
+)
+
+
+class DisplayPool(object):
+    """
+    Pool of long-running Xvfb servers shared by the renderings of a process
+    
+    Renderings are executed on an already running X display instead of paying the
+    start up of a new X server per document, as xvfb-run does.
+    At most size displays are started, on demand, each one used by one rendering at a time.
+    They are terminated when the process exits.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.reset()
+        atexit.register(self.close)
+    
+    def reset(self):
+        self.pid = os.getpid()
+        self.idle = queue.Queue()
+        self.processes = {}
+    
+    def start(self):
+        """ Starts a new Xvfb server, letting it choose a free display number """
+        read, write = os.pipe()
+        try:
+            process = subprocess.Popen(
+                ['Xvfb', '-displayfd', str(write), '-screen', '0', '640x4800x16', '-nolisten', 'tcp'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, pass_fds=(write,))
+        finally:
+            os.close(write)
+        with os.fdopen(read) as handle:
+            number = handle.readline().strip()
+        if not number:
+            process.kill()
+            raise OSError("Xvfb failed to start")
+        display = ':%s' % number
+        self.processes[display] = process
+        return display
+    
+    def acquire(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Displays belong to the process that started them
+                self.reset()
+            if self.idle.empty() and len(self.processes) < self.size:
+                return self.start()
+        display = self.idle.get()
+        if self.processes[display].poll() is not None:
+            with self.lock:
+                self.processes.pop(display)
+                return self.start()
+        return display
+    
+    def release(self, display):
+        self.idle.put(display)
+    
+    @contextmanager
+    def display(self):
+        display = self.acquire()
+        try:
+            yield display
+        finally:
+            self.release(display)
+    
+    def close(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                # Forked processes leave the displays of their parent alone
+                for process in self.processes.values():
+                    process.terminate()
+                for process in self.processes.values():
+                    process.wait()
+            self.reset()
+
+
+def html_to_pdf(html, pool=None):
+    """ converts HTL to PDF using wkhtmltopdf, on a display of pool when provided """
+    if pool is None:
+        return run(
+            'PATH=$PATH:/usr/local/bin/\n'
+            'xvfb-run -a -s "-screen 0 640x4800x16" ' + WKHTMLTOPDF,
+            stdin=html.encode('utf-8')
+        ).stdout
+    with pool.display() as display:
+        return run(
+            'PATH=$PATH:/usr/local/bin/\n'
+            'DISPLAY=%s %s' % (display, WKHTMLTOPDF),
+            stdin=html.encode('utf-8')
+        ).stdout
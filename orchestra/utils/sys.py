@@ -130,6 +130,40 @@ def sshrun(addr, command, *args, **kwargs):
     return run(cmd, *args, **kwargs)
 
 
+def pooled_sshrun(addr, command, display=False, error_codes=[0], silent=False, stdin=b''):
+    """
+    sshrun() over the pooled SSH transports of the orchestration, saving a handshake per command.
+    Unlike the ssh client it only authenticates with ORCHESTRATION_SSH_KEY_PATH,
+    ignoring the user ssh config and agent.
+    """
+    from orchestra.contrib.orchestration.ssh import pool
+    if display:
+        sys.stderr.write("\n\033[1m $ ssh root@%s %s\033[0m\n" % (addr, command))
+    stdout, stderr, return_code = pool.run(addr, command, stdin=stdin)
+    if display and stdout:
+        sys.stdout.write(stdout.decode('utf8'))
+    if display and stderr:
+        sys.stderr.write(stderr.decode('utf8'))
+    
+    out = _Attribute(stdout.strip())
+    err = stderr.strip()
+    
+    out.failed = False
+    out.return_code = return_code
+    out.stderr = err
+    if return_code not in error_codes:
+        out.failed = True
+        msg = "\npooled_sshrun() encountered an error (return code %s) while executing '%s' on %s\n"
+        msg = msg % (return_code, command, addr)
+        if display:
+            sys.stderr.write("\n\033[1;31mCommandError: %s %s\033[m\n" % (msg, err))
+        if not silent:
+            raise CommandError("%s %s %s" % (msg, err, out))
+    
+    out.succeeded = not out.failed
+    return out
+
+
 def get_default_celeryd_username():
     """ Introspect celeryd defaults file in order to get its username """
     user = None